@@ -0,0 +1,177 @@
+import argparse
+import configparser
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+from logger_utils import get_logger
+from session_timeouts import get_session_registry
+
+# ---------------- CONFIGURATION ----------------
+config = configparser.ConfigParser()
+config.read("config.ini")
+
+SOCKET_PATH = config.get("admin", "socket_path", fallback="atm_admin.sock")
+DRAIN_TIMEOUT = float(config.get("admin", "drain_timeout", fallback="60"))
+# Seconds an admin client may take to send its command and read the reply
+REQUEST_TIMEOUT = float(config.get("admin", "request_timeout", fallback="5"))
+
+
+class AdminServer:
+    """
+    Local control socket for operators.
+
+    Listens on a Unix domain socket, so only users with access to the
+    socket file can connect. Each request is one line and is answered with
+    one line of JSON:
+
+        list        Live sessions with their state, mobile, age and how long
+                    they have been in the current stage
+        kill <id>   Disconnect a session, also one blocked sending a reply
+        drain       Stop accepting connections, let in-flight requests finish
+                    and shut the server down
+        refill <denomination>=<notes> ...
+                    Record notes loaded into the cassettes, e.g. 'refill 500=200'
+    """
+
+    def __init__(self, path=SOCKET_PATH, registry=None):
+        self.path = path
+        self.registry = registry or get_session_registry()
+        self.draining = threading.Event()
+        self.sock = None
+        self.thread = None
+        self.logger = get_logger("AdminControl")
+
+    def start(self):
+        """Start listening; returns False if Unix sockets are unavailable on this platform."""
+        if not hasattr(socket, "AF_UNIX"):
+            self.logger.error("Admin control socket requires Unix domain sockets; disabled")
+            return False
+
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # Left behind by a previous run
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # Create the socket file owner-only, so it is never reachable by others
+        previous_umask = os.umask(0o177)
+        try:
+            self.sock.bind(self.path)
+        finally:
+            os.umask(previous_umask)
+        self.sock.listen(5)
+
+        self.thread = threading.Thread(target=self._serve, daemon=True, name="AdminControl")
+        self.thread.start()
+        self.logger.info(f"Admin control socket listening on {self.path}")
+        return True
+
+    def stop(self):
+        """Close the control socket and remove its file."""
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    def _serve(self):
+        while self.sock is not None:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return  # Socket closed by stop()
+            with conn:
+                # Commands are served one at a time; a stalled client must not block drain or kill
+                conn.settimeout(REQUEST_TIMEOUT)
+                try:
+                    request = conn.makefile("r").readline()
+                    reply = self.handle(request)
+                except Exception as e:
+                    reply = {"status": "error", "message": str(e)}
+                try:
+                    conn.sendall((json.dumps(reply) + "\n").encode())
+                except OSError:
+                    pass  # Client went away or stopped reading
+
+    def handle(self, request):
+        """Execute one admin command and return the reply as a dict."""
+        parts = request.split()
+        command = parts[0].lower() if parts else ""
+
+        if command == "list":
+            now = time.time()
+            sessions = [guard.describe(now) for _, guard in self.registry.snapshot()]
+            return {"status": "ok", "draining": self.draining.is_set(), "sessions": sessions}
+
+        if command == "kill" and len(parts) == 2 and parts[1].isdigit():
+            guard = self.registry.get(int(parts[1]))
+            if guard is None:
+                return {"status": "error", "message": f"No session {parts[1]}"}
+            guard.reap("admin_kill")
+            self.logger.info(f"Session {parts[1]} ({guard.mobile or 'unknown'}) killed by admin")
+            return {"status": "ok", "message": f"Session {parts[1]} killed"}
+
+        if command == "drain":
+            remaining = self.registry.drain()
+            self.draining.set()
+            self.logger.info(f"Drain requested; waiting for {remaining} sessions")
+            return {"status": "ok", "message": f"Draining {remaining} sessions"}
+
+        if command == "refill" and len(parts) > 1:
+            notes = {}
+            for pair in parts[1:]:
+                denomination, _, count = pair.partition("=")
+                if not (denomination.isdigit() and count.isdigit()):
+                    return {"status": "error", "message": f"Invalid refill entry: {pair}"}
+                notes[int(denomination)] = notes.get(int(denomination), 0) + int(count)
+            from db_handler import refill_cassettes  # Imported late: only the refill command needs the database
+            reply = refill_cassettes(notes)
+            if reply["status"] == "ok":
+                self.logger.info(f"Refill by admin: {reply['message']}")
+            return {"status": reply["status"], "message": reply["message"]}
+
+        return {"status": "error", "message": "Usage: list | kill <id> | drain | refill <denomination>=<notes> ..."}
+
+
+def send_command(command, path=SOCKET_PATH):
+    """Send one command to a running server's control socket and return the reply."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        sock.sendall((command + "\n").encode())
+        return json.loads(sock.makefile("r").readline())
+
+
+def format_sessions(reply):
+    """Render a 'list' reply as a table."""
+    lines = [f"{'ID':>5}  {'ADDRESS':<21} {'MOBILE':<12} {'STATE':<11} {'AGE':>8} {'STAGE':>8}"]
+    for session in reply["sessions"]:
+        lines.append(
+            f"{session['id']:>5}  {session['addr']:<21} {session['mobile'] or '-':<12} "
+            f"{session['state']:<11} {session['age']:>7.1f}s {session['stage_latency']:>7.2f}s"
+        )
+    lines.append(f"{len(reply['sessions'])} sessions" + (" (draining)" if reply["draining"] else ""))
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Control a running ATM server.")
+    parser.add_argument("command", choices=["list", "kill", "drain", "refill"])
+    parser.add_argument("arguments", nargs="*", help="Session to kill, or denomination=notes pairs to refill")
+    parser.add_argument("--socket", default=SOCKET_PATH, help="Control socket path")
+    args = parser.parse_args()
+
+    if args.command == "kill" and len(args.arguments) != 1:
+        parser.error("kill requires a session id")
+    if args.command == "refill" and not args.arguments:
+        parser.error("refill requires denomination=notes pairs, e.g. 500=200")
+    command = " ".join([args.command] + args.arguments)
+
+    try:
+        reply = send_command(command, args.socket)
+    except OSError as e:
+        sys.exit(f"Cannot reach server on {args.socket}: {e}")
+
+    if reply["status"] != "ok":
+        sys.exit(reply["message"])
+    print(format_sessions(reply) if args.command == "list" else reply["message"])
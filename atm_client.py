@@ -40,7 +40,7 @@ def start_client():
             client_socket.sendall(user_input.encode())
 
             # Manual exit by user
-            if user_input.strip().lower() in ["exit", "quit", "3"]:
+            if user_input.strip().lower() in ["exit", "quit", "4"]:
                 print(" Exiting ATM Client.")
                 break
 
@@ -0,0 +1,65 @@
+import decimal
+import timeit
+
+from money import format_paise, parse_amount, rupees
+
+# A withdrawal as it arrives off the socket, and the balances as MySQL returns them:
+# DECIMAL columns for the old path, CAST(col * 100 AS SIGNED) integers for paise
+AMOUNT_TEXT = "2500"
+DB_BALANCE = decimal.Decimal("10500.00")
+DB_BANK_BALANCE = decimal.Decimal("1218344.00")
+DB_BALANCE_PAISE = 1050000
+DB_BANK_BALANCE_PAISE = 121834400
+ITERATIONS = 100000
+
+MIN_WITHDRAWAL = rupees(100)
+MAX_WITHDRAWAL = rupees(5000)
+
+
+def decimal_path():
+    """The previous path: float parse, Decimal(str(...)) per value, float/Decimal journal cells."""
+    amount = float(AMOUNT_TEXT)
+    amount_dec = decimal.Decimal(str(amount))
+    if amount_dec <= 0 or amount_dec < 100 or amount_dec > 5000:
+        return None
+    balance = decimal.Decimal(str(DB_BALANCE))
+    bank_balance = decimal.Decimal(str(DB_BANK_BALANCE))
+    if balance < amount_dec or bank_balance < amount_dec:
+        return None
+    new_balance = balance - amount_dec
+    new_bank_balance = bank_balance - amount_dec
+    message = f"Withdrawal successful. New balance: ₹{new_balance:.2f}"
+    journal = (str(amount), str(new_balance), str(new_bank_balance))
+    return message, journal
+
+
+def paise_path():
+    """The integer paise path: one strict parse, plain int compare/arithmetic, formatting at the edges."""
+    amount = parse_amount(AMOUNT_TEXT)
+    if amount <= 0 or amount < MIN_WITHDRAWAL or amount > MAX_WITHDRAWAL:
+        return None
+    balance = DB_BALANCE_PAISE
+    bank_balance = DB_BANK_BALANCE_PAISE
+    if balance < amount or bank_balance < amount:
+        return None
+    new_balance = balance - amount
+    new_bank_balance = bank_balance - amount
+    message = f"Withdrawal successful. New balance: ₹{format_paise(new_balance)}"
+    journal = (format_paise(amount), format_paise(new_balance), format_paise(new_bank_balance))
+    return message, journal
+
+
+def run_benchmark(iterations=ITERATIONS):
+    """Time both paths and print per-call latency."""
+    assert decimal_path()[0] == paise_path()[0]
+    results = {}
+    for name, func in (("Decimal", decimal_path), ("Paise", paise_path)):
+        seconds = min(timeit.repeat(func, number=iterations, repeat=5))
+        results[name] = seconds
+        print(f"{name:<8} {seconds / iterations * 1e6:8.3f} us/op")
+    print(f"Paise/Decimal time ratio: {results['Paise'] / results['Decimal']:.2f}")
+    return results
+
+
+if __name__ == "__main__":
+    run_benchmark()
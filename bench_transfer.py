@@ -0,0 +1,140 @@
+import argparse
+import random
+import threading
+import time
+
+from db_handler import get_db_connection, transfer
+from money import format_paise, rupees
+
+# Benchmark accounts are removed afterwards. Their prefix is not a digit, so
+# the server never accepts it as a customer's mobile number and a real
+# account can neither be reset nor deleted by the benchmark
+BENCH_PREFIX = "bench-"
+OPENING_BALANCE = rupees(10000)
+
+
+def create_accounts(count):
+    """Create the benchmark accounts (resetting any left by an earlier run) and return their mobile numbers."""
+    mobiles = [f"{BENCH_PREFIX}{index:05d}" for index in range(count)]
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    try:
+        for mobile in mobiles:
+            cursor.execute(
+                "INSERT INTO users (mobile, pin, balance, failed_attempts, blacklisted) VALUES (%s, %s, %s / 100, 0, FALSE) "
+                "ON DUPLICATE KEY UPDATE balance = VALUES(balance)",
+                (mobile, "00000", OPENING_BALANCE)
+            )
+        connection.commit()
+    finally:
+        cursor.close()
+        connection.close()
+    return mobiles
+
+
+def total_balance():
+    """Return the sum of the benchmark accounts' balances in paise."""
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            "SELECT CAST(SUM(balance) * 100 AS SIGNED) FROM users WHERE mobile LIKE %s",
+            (f"{BENCH_PREFIX}%",)
+        )
+        return cursor.fetchone()[0] or 0
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def drop_accounts():
+    """Remove the benchmark accounts."""
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    try:
+        cursor.execute("DELETE FROM users WHERE mobile LIKE %s", (f"{BENCH_PREFIX}%",))
+        connection.commit()
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def run_benchmark(accounts=20, threads=16, transfers=5000, max_amount=500, seed=None):
+    """
+    Run random concurrent transfers between a small set of hot accounts.
+
+    Few accounts and many threads maximise opposite-direction transfers on
+    the same pair of rows, which deadlock without ordered locking.
+
+    Returns:
+        dict: Throughput, outcome counts and whether total money was conserved
+    """
+    rng = random.Random(seed)
+    plan = []
+    outcomes = {"ok": 0, "insufficient": 0, "deadlock": 0, "error": 0}
+    outcomes_lock = threading.Lock()
+    next_index = [0]
+
+    def worker():
+        while True:
+            with outcomes_lock:
+                index = next_index[0]
+                next_index[0] += 1
+            if index >= len(plan):
+                return
+            result = transfer(*plan[index])
+            if result["status"] == "ok":
+                outcome = "ok"
+            elif "Insufficient" in result["message"]:
+                outcome = "insufficient"
+            elif "Deadlock" in result["message"]:
+                outcome = "deadlock"
+            else:
+                outcome = "error"
+            with outcomes_lock:
+                outcomes[outcome] += 1
+
+    try:
+        mobiles = create_accounts(accounts)
+        expected_total = total_balance()
+        for _ in range(transfers):
+            sender, recipient = rng.sample(mobiles, 2)
+            plan.append((sender, recipient, rupees(rng.randint(1, max_amount))))
+
+        started = time.perf_counter()
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        final_total = total_balance()
+    finally:
+        # Also after an error or Ctrl-C, so no benchmark accounts are left behind
+        drop_accounts()
+    return {
+        "elapsed": elapsed,
+        "throughput": transfers / elapsed,
+        "outcomes": outcomes,
+        "expected_total": expected_total,
+        "final_total": final_total,
+        "conserved": final_total == expected_total,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stress test concurrent account-to-account transfers.")
+    parser.add_argument("--accounts", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--transfers", type=int, default=5000)
+    parser.add_argument("--max-amount", type=int, default=500, help="Largest random transfer in rupees")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    result = run_benchmark(args.accounts, args.threads, args.transfers, args.max_amount, args.seed)
+    print(f"{args.transfers} transfers on {args.threads} threads in {result['elapsed']:.2f}s "
+          f"({result['throughput']:.0f} transfers/s)")
+    print("Outcomes: " + ", ".join(f"{name}={count}" for name, count in result["outcomes"].items()))
+    print(f"Total money: ₹{format_paise(result['expected_total'])} -> ₹{format_paise(result['final_total'])} "
+          f"({'conserved' if result['conserved'] else 'NOT CONSERVED'})")
@@ -0,0 +1,103 @@
+import configparser
+
+# ---------------- CONFIGURATION ----------------
+config = configparser.ConfigParser()
+config.read("config.ini")
+
+# Note denominations in rupees, most preferred first; the planner uses as
+# many notes of an earlier denomination as still allows an exact plan
+PREFERENCE = tuple(
+    int(denomination) for denomination in config.get("cassettes", "preference", fallback="500,200,100").split(",")
+)
+INITIAL_NOTES = {
+    denomination: int(config.get("cassettes", f"notes_{denomination}", fallback="1000"))
+    for denomination in PREFERENCE
+}
+
+
+# -----------------------------
+# Inventory
+# -----------------------------
+def inventory_key(notes):
+    """
+    Build the inventory state the planner works on.
+
+    Args:
+        notes (dict): denomination -> notes currently in that cassette
+
+    Returns:
+        tuple: (denomination, notes) pairs in preference order
+    """
+    return tuple((denomination, int(notes.get(denomination, 0))) for denomination in PREFERENCE)
+
+
+def cash_total(inventory):
+    """Total rupees held in the cassettes."""
+    return sum(denomination * notes for denomination, notes in inventory)
+
+
+# -----------------------------
+# Dispensing Planner
+# -----------------------------
+def plan_dispense(inventory, amount):
+    """
+    Find a note combination for an amount that the cassettes can supply.
+
+    Denominations are tried in preference order, taking as many notes of
+    each as still leaves an exact remainder for the rest. Remainders that
+    proved impossible are remembered for the duration of the search, so it
+    visits each (denomination, remainder) pair at most once: a few hundred
+    steps at worst for ATM-sized amounts, and usually one per denomination.
+    Nothing is cached across calls, since every withdrawal leaves the
+    cassettes in a new state.
+
+    Args:
+        inventory (tuple): State from inventory_key()
+        amount (int): Whole rupees to dispense
+
+    Returns:
+        tuple: (denomination, count) pairs with count > 0, or None if the
+        amount cannot be dispensed exactly
+    """
+    dead_ends = set()
+
+    def search(index, remaining):
+        if remaining == 0:
+            return ()
+        if index == len(inventory) or (index, remaining) in dead_ends:
+            return None
+        denomination, notes = inventory[index]
+        for count in range(min(notes, remaining // denomination), -1, -1):
+            rest = search(index + 1, remaining - count * denomination)
+            if rest is not None:
+                return ((denomination, count),) + rest if count else rest
+        dead_ends.add((index, remaining))
+        return None
+
+    if amount <= 0:
+        return None
+    return search(0, amount)
+
+
+def dispense_error(inventory, amount):
+    """
+    Explain why an amount cannot be dispensed.
+
+    Returns:
+        str: Error message, or None if the amount is dispensable
+    """
+    if plan_dispense(inventory, amount) is not None:
+        return None
+    if cash_total(inventory) < amount:
+        return "ATM out of cash. Please try a smaller amount."
+    stocked = [denomination for denomination, notes in inventory if notes]
+    if not stocked:
+        return "ATM out of cash. Please try a smaller amount."
+    return (f"ATM cannot dispense ₹{amount} with the notes available "
+            f"(₹{', ₹'.join(str(denomination) for denomination in sorted(stocked))}). "
+            f"Please try a different amount.")
+
+
+def format_plan(plan):
+    """Describe a plan for the customer, e.g. '2 x ₹500, 1 x ₹200'."""
+    return ", ".join(f"{count} x ₹{denomination}" for denomination, count in plan)
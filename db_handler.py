@@ -1,64 +1,91 @@
 import csv
 import os
+import threading
 import time
 import datetime
 import mysql.connector
 import configparser
-import decimal
+from money import format_paise, paise_from_db, parse_amount, rupees
+from cash_dispenser import INITIAL_NOTES, inventory_key, plan_dispense, dispense_error, format_plan
+from journal_archive import CLIENT_TRANSACTION_FILE, BANK_TRANSACTION_FILE, rotate_journal, archive_in_background
+from server_monitor import get_monitor
+from withdrawal_limits import get_limiter
+
+# Per-transaction withdrawal range and the opening balance of new accounts
+MIN_WITHDRAWAL = rupees(100)
+MAX_WITHDRAWAL = rupees(5000)
+INITIAL_BALANCE = rupees(1000)
 
 # -----------------------------
 # Transaction Logging
 # -----------------------------
-CLIENT_TRANSACTION_FILE = "client.csv"
-BANK_TRANSACTION_FILE = "bank.csv"
+# Journaled actions counted as transactions in the monitor's rate metric
+# (a transfer counts once, on its outgoing leg)
+MONITORED_ACTIONS = ("withdraw", "deposit", "transfer_out")
+
+_journal_lock = threading.Lock()
+
+def _journal_value(value):
+    """Format an amount or balance for the journals ('' when absent)."""
+    return "" if value is None else format_paise(value)
 
 def log_transaction(mobile, action, amount, balance, start_time=None, bank_balance=None):
     """Log transaction details to CSV file"""
-    # Create file with headers if it doesn't exist
-    client_file_exists = os.path.isfile(CLIENT_TRANSACTION_FILE)
-    bank_file_exists = os.path.isfile(BANK_TRANSACTION_FILE)
-    
     current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     elapsed_time = ""
     if start_time:
         elapsed_time = f"{time.time() - start_time:.2f}"
     
-    # Log client transaction
-    with open(CLIENT_TRANSACTION_FILE, 'a', newline='') as csvfile:
-        fieldnames = ['Mobile_Number', 'Action', 'Amount', 'User_Balance', 'Bank_Balance', 'Timestamp', 'Session_Start', 'Elapsed_Time']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames, delimiter='\t')
-        
-        if not client_file_exists:
-            writer.writeheader()
-            
-        writer.writerow({
-            'Mobile_Number': mobile,
-            'Action': action,
-            'Amount': amount if amount else "",
-            'User_Balance': balance if balance else "",
-            'Bank_Balance': bank_balance if bank_balance else "",
-            'Timestamp': current_time,
-            'Session_Start': start_time if start_time else "",
-            'Elapsed_Time': elapsed_time
-        })
-    
-    # Log bank transaction if it affects bank balance
-    if action in ["withdraw", "deposit"] and bank_balance is not None:
-        with open(BANK_TRANSACTION_FILE, 'a', newline='') as csvfile:
-            fieldnames = ['Mobile_Number', 'Action', 'Amount', 'Bank_Balance', 'Timestamp']
+    # Serialize writers so a journal is never rotated in the middle of a write
+    with _journal_lock:
+        for path in (CLIENT_TRANSACTION_FILE, BANK_TRANSACTION_FILE):
+            segment = rotate_journal(path)
+            if segment:
+                archive_in_background(segment)
+        
+        # Create file with headers if it doesn't exist
+        client_file_exists = os.path.isfile(CLIENT_TRANSACTION_FILE)
+        bank_file_exists = os.path.isfile(BANK_TRANSACTION_FILE)
+    
+        # Log client transaction
+        with open(CLIENT_TRANSACTION_FILE, 'a', newline='') as csvfile:
+            fieldnames = ['Mobile_Number', 'Action', 'Amount', 'User_Balance', 'Bank_Balance', 'Timestamp', 'Session_Start', 'Elapsed_Time']
             writer = csv.DictWriter(csvfile, fieldnames=fieldnames, delimiter='\t')
-            
-            if not bank_file_exists:
+        
+            if not client_file_exists:
                 writer.writeheader()
-                
+            
             writer.writerow({
                 'Mobile_Number': mobile,
                 'Action': action,
-                'Amount': amount if amount else "",
-                'Bank_Balance': bank_balance,
-                'Timestamp': current_time
+                'Amount': _journal_value(amount),
+                'User_Balance': _journal_value(balance),
+                'Bank_Balance': _journal_value(bank_balance),
+                'Timestamp': current_time,
+                'Session_Start': start_time if start_time else "",
+                'Elapsed_Time': elapsed_time
             })
     
+        # Log bank transaction if it affects bank balance
+        if action in ["withdraw", "deposit"] and bank_balance is not None:
+            with open(BANK_TRANSACTION_FILE, 'a', newline='') as csvfile:
+                fieldnames = ['Mobile_Number', 'Action', 'Amount', 'Bank_Balance', 'Timestamp']
+                writer = csv.DictWriter(csvfile, fieldnames=fieldnames, delimiter='\t')
+            
+                if not bank_file_exists:
+                    writer.writeheader()
+                
+                writer.writerow({
+                    'Mobile_Number': mobile,
+                    'Action': action,
+                    'Amount': _journal_value(amount),
+                    'Bank_Balance': _journal_value(bank_balance),
+                    'Timestamp': current_time
+                })
+    
+    if action in MONITORED_ACTIONS:
+        get_monitor().record_transaction()
+    
     return True
 
 # -----------------------------
@@ -144,6 +171,23 @@ def initialize_database():
         cursor.execute("SELECT COUNT(*) FROM bank")
         if cursor.fetchone()[0] == 0:
             cursor.execute("INSERT INTO bank (id, total_funds) VALUES (1, 10000.00)")
+        
+        # Create cassettes table for per-denomination note inventory
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS cassettes (
+            denomination INT PRIMARY KEY,
+            notes INT NOT NULL DEFAULT 0
+        )
+        """)
+        
+        # Load cassettes from config.ini if not already set
+        cursor.execute("SELECT COUNT(*) FROM cassettes")
+        if cursor.fetchone()[0] == 0:
+            for denomination, notes in INITIAL_NOTES.items():
+                cursor.execute(
+                    "INSERT INTO cassettes (denomination, notes) VALUES (%s, %s)",
+                    (denomination, notes)
+                )
             
         connection.commit()
         cursor.close()
@@ -179,14 +223,14 @@ def register_user(mobile):
         
         # Register new user
         cursor.execute(
-            "INSERT INTO users (mobile, pin, balance, failed_attempts, blacklisted) VALUES (%s, %s, %s, %s, %s)",
-            (mobile, pin, 1000.00, 0, False)
+            "INSERT INTO users (mobile, pin, balance, failed_attempts, blacklisted) VALUES (%s, %s, %s / 100, %s, %s)",
+            (mobile, pin, INITIAL_BALANCE, 0, False)
         )
         connection.commit()
         
         return {
             "status": "ok",
-            "message": f"New user registered. Your PIN is {pin}. Initial balance: ₹1000.00.\nPress Enter to continue:"
+            "message": f"New user registered. Your PIN is {pin}. Initial balance: ₹{format_paise(INITIAL_BALANCE)}.\nPress Enter to continue:"
         }
     except Exception as e:
         connection.rollback()
@@ -249,7 +293,7 @@ def authenticate_user(mobile, pin):
         return {
             "status": "ok",
             "message": "Authentication successful. \n Press Enter to continue:",
-            "balance": user["balance"]
+            "balance": paise_from_db(user["balance"])
         }
     except Exception as e:
         return {"status": "error", "message": f"Authentication error: {str(e)}"}
@@ -269,13 +313,13 @@ def get_balance(mobile):
     cursor = connection.cursor(dictionary=True)
     
     try:
-        cursor.execute("SELECT balance FROM users WHERE mobile = %s", (mobile,))
+        cursor.execute("SELECT CAST(balance * 100 AS SIGNED) AS balance_paise FROM users WHERE mobile = %s", (mobile,))
         user = cursor.fetchone()
         
         if not user:
             return {"status": "error", "message": "User not found."}
         
-        return {"status": "ok", "balance": user["balance"]}
+        return {"status": "ok", "balance": user["balance_paise"]}
     except Exception as e:
         return {"status": "error", "message": f"Error retrieving balance: {str(e)}"}
     finally:
@@ -294,13 +338,13 @@ def get_bank_balance():
     cursor = connection.cursor(dictionary=True)
     
     try:
-        cursor.execute("SELECT total_funds FROM bank WHERE id = 1")
+        cursor.execute("SELECT CAST(total_funds * 100 AS SIGNED) AS total_funds_paise FROM bank WHERE id = 1")
         bank = cursor.fetchone()
         
         if not bank:
             return {"status": "error", "message": "Bank data not found."}
         
-        return {"status": "ok", "bank_balance": bank["total_funds"]}
+        return {"status": "ok", "bank_balance": bank["total_funds_paise"]}
     except Exception as e:
         return {"status": "error", "message": f"Error retrieving bank balance: {str(e)}"}
     finally:
@@ -308,152 +352,509 @@ def get_bank_balance():
         connection.close()
 
 # -----------------------------
-# Withdraw
+# Transactions
 # -----------------------------
-def withdraw(mobile, amount):
-    """Withdraw money from user account."""
-    # Validate amount
-    try:
-        amount = decimal.Decimal(str(amount))
-    except:
-        return {"status": "error", "message": "Invalid amount format."}
-        
-    if amount <= 0:
-        return {"status": "error", "message": "Withdrawal amount must be positive."}
-    
-    if amount < 100:
-        return {"status": "error", "message": "Minimum withdrawal amount is ₹100."}
-        
-    if amount > 5000:
-        return {"status": "error", "message": "Maximum withdrawal limit is ₹5000 per transaction."}
-    
+class _Transaction:
+    """
+    An open database transaction shared by one or more operations.
+
+    Operations never commit themselves; whoever opened the transaction
+    commits or rolls back. In-memory side effects (such as withdrawal limit
+    reservations) register an undo callback that runs on rollback.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.cursor = connection.cursor(dictionary=True)
+        self.undo = []
+
+    def commit(self):
+        self.connection.commit()
+        self.undo.clear()
+
+    def rollback(self):
+        try:
+            self.connection.rollback()
+        finally:
+            while self.undo:
+                self.undo.pop()()
+
+    def close(self):
+        self.cursor.close()
+        self.connection.close()
+
+
+def _run_transaction(operation, error_label, *args):
+    """Run a single operation in its own transaction, committing only if it succeeds."""
     connection = get_db_connection()
     if not connection:
         return {"status": "error", "message": "Database connection failed."}
     
-    cursor = connection.cursor(dictionary=True)
+    transaction = _Transaction(connection)
     
     try:
-        # Get user balance
-        cursor.execute("SELECT balance FROM users WHERE mobile = %s", (mobile,))
-        user = cursor.fetchone()
-        
-        if not user:
-            return {"status": "error", "message": "User not found."}
-        
-        balance = decimal.Decimal(str(user["balance"]))
-        
-        # Check if sufficient balance
-        if balance < amount:
-            return {"status": "error", "message": "Insufficient balance."}
-        
-        # Get bank balance
-        cursor.execute("SELECT total_funds FROM bank WHERE id = 1")
-        bank = cursor.fetchone()
-        
-        if not bank:
-            return {"status": "error", "message": "Bank data not found."}
-        
-        bank_balance = decimal.Decimal(str(bank["total_funds"]))
-        
-        # Check if bank has sufficient funds
-        if bank_balance < amount:
-            return {"status": "error", "message": "ATM out of cash. Please try a smaller amount."}
+        result = operation(transaction, *args)
+        if result["status"] == "ok":
+            transaction.commit()
+        else:
+            transaction.rollback()
+        return result
+    except Exception as e:
+        transaction.rollback()
+        return {"status": "error", "message": f"{error_label} error: {str(e)}"}
+    finally:
+        transaction.close()
+
+
+def _is_paise(amount):
+    """Whether an amount is int paise; rupee text is parsed by the caller (see parse_amount)."""
+    return type(amount) is int
+
+
+def _lock_user(cursor, mobile):
+    """Lock a users row and return its balance, or None if the user does not exist."""
+    cursor.execute("SELECT CAST(balance * 100 AS SIGNED) AS balance_paise FROM users WHERE mobile = %s FOR UPDATE", (mobile,))
+    user = cursor.fetchone()
+    return user["balance_paise"] if user else None
+
+
+def _lock_bank(cursor):
+    """Lock the bank row and return total funds, or None if it is missing."""
+    cursor.execute("SELECT CAST(total_funds * 100 AS SIGNED) AS total_funds_paise FROM bank WHERE id = 1 FOR UPDATE")
+    bank = cursor.fetchone()
+    return bank["total_funds_paise"] if bank else None
+
+# -----------------------------
+# Withdraw
+# -----------------------------
+def _check_withdrawal(amount):
+    """Validate a withdrawal amount in paise; return (paise, None) or (None, error result)."""
+    if not _is_paise(amount):
+        return None, {"status": "error", "message": "Invalid amount format."}
         
-        # Update user balance
-        new_balance = balance - amount
-        cursor.execute(
-            "UPDATE users SET balance = %s WHERE mobile = %s",
-            (new_balance, mobile)
-        )
+    if amount <= 0:
+        return None, {"status": "error", "message": "Withdrawal amount must be positive."}
+    
+    if amount < MIN_WITHDRAWAL:
+        return None, {"status": "error", "message": f"Minimum withdrawal amount is ₹{MIN_WITHDRAWAL // 100}."}
         
-        # Update bank balance
-        new_bank_balance = bank_balance - amount
+    if amount > MAX_WITHDRAWAL:
+        return None, {"status": "error", "message": f"Maximum withdrawal limit is ₹{MAX_WITHDRAWAL // 100} per transaction."}
+    
+    if amount % 100:
+        return None, {"status": "error", "message": "ATM can only dispense whole rupee amounts."}
+    
+    return amount, None
+
+
+def _withdraw(transaction, mobile, amount):
+    """Withdraw a validated amount inside an open transaction."""
+    # Count the withdrawal against the daily and rolling limits up front;
+    # the reservation is released if the transaction rolls back
+    limiter = get_limiter()
+    reserved_at = time.time()
+    limit_error = limiter.reserve(mobile, amount, reserved_at)
+    if limit_error:
+        return {"status": "error", "message": limit_error}
+    transaction.undo.append(lambda: limiter.release(mobile, amount, reserved_at))
+    
+    cursor = transaction.cursor
+    
+    # Get user balance
+    # Lock order is always users rows (by mobile) before the bank row
+    balance = _lock_user(cursor, mobile)
+    
+    if balance is None:
+        return {"status": "error", "message": "User not found."}
+    
+    # Check if sufficient balance
+    if balance < amount:
+        return {"status": "error", "message": "Insufficient balance."}
+    
+    # Get bank balance
+    bank_balance = _lock_bank(cursor)
+    
+    if bank_balance is None:
+        return {"status": "error", "message": "Bank data not found."}
+    
+    # The bank's funds must cover the withdrawal; whether the cassettes hold
+    # the notes is a separate check (dispense_error below)
+    if bank_balance < amount:
+        return {"status": "error", "message": "Insufficient bank funds for this withdrawal. Please contact the bank."}
+    
+    # Plan the notes to dispense from the cassettes (locked after the bank row)
+    cursor.execute("SELECT denomination, notes FROM cassettes FOR UPDATE")
+    inventory = inventory_key({row["denomination"]: row["notes"] for row in cursor.fetchall()})
+    plan = plan_dispense(inventory, amount // 100)
+    if plan is None:
+        return {"status": "error", "message": dispense_error(inventory, amount // 100)}
+    
+    # Update user balance
+    new_balance = balance - amount
+    cursor.execute(
+        "UPDATE users SET balance = %s / 100 WHERE mobile = %s",
+        (new_balance, mobile)
+    )
+    
+    # Update bank balance
+    new_bank_balance = bank_balance - amount
+    cursor.execute(
+        "UPDATE bank SET total_funds = %s / 100 WHERE id = 1",
+        (new_bank_balance,)
+    )
+    
+    # Take the dispensed notes out of the cassettes
+    for denomination, count in plan:
         cursor.execute(
-            "UPDATE bank SET total_funds = %s WHERE id = 1",
-            (new_bank_balance,)
+            "UPDATE cassettes SET notes = notes - %s WHERE denomination = %s",
+            (count, denomination)
         )
-        
-        connection.commit()
-        
-        return {
-            "status": "ok",
-            "message": f"Withdrawal successful. New balance: ₹{new_balance:.2f} \n Press Enter to continue",
-            "balance": new_balance,
-            "bank_balance": new_bank_balance
-        }
-    except Exception as e:
-        connection.rollback()
-        return {"status": "error", "message": f"Withdrawal error: {str(e)}"}
-    finally:
-        cursor.close()
-        connection.close()
+    
+    return {
+        "status": "ok",
+        "message": f"Withdrawal successful. Please collect {format_plan(plan)}. New balance: ₹{format_paise(new_balance)} \n Press Enter to continue",
+        "amount": amount,
+        "balance": new_balance,
+        "bank_balance": new_bank_balance,
+        "notes": plan
+    }
+
+
+def withdraw(mobile, amount):
+    """Withdraw an amount in int paise from user account."""
+    amount, error = _check_withdrawal(amount)
+    if error:
+        return error
+    return _run_transaction(_withdraw, "Withdrawal", mobile, amount)
 
 # -----------------------------
 # Deposit
 # -----------------------------
+def _check_deposit(amount):
+    """Validate a deposit amount in paise; return (paise, None) or (None, error result)."""
+    if not _is_paise(amount):
+        return None, {"status": "error", "message": "Invalid amount format."}
+        
+    if amount <= 0:
+        return None, {"status": "error", "message": "Deposit amount must be positive."}
+    
+    return amount, None
+
+
+def _deposit(transaction, mobile, amount):
+    """Deposit a validated amount inside an open transaction."""
+    cursor = transaction.cursor
+    
+    # Get user balance
+    # Lock order is always users rows (by mobile) before the bank row
+    balance = _lock_user(cursor, mobile)
+    
+    if balance is None:
+        return {"status": "error", "message": "User not found."}
+    
+    # Get bank balance
+    bank_balance = _lock_bank(cursor)
+    
+    if bank_balance is None:
+        return {"status": "error", "message": "Bank data not found."}
+    
+    # Update user balance
+    new_balance = balance + amount
+    cursor.execute(
+        "UPDATE users SET balance = %s / 100 WHERE mobile = %s",
+        (new_balance, mobile)
+    )
+    
+    # Update bank balance
+    new_bank_balance = bank_balance + amount
+    cursor.execute(
+        "UPDATE bank SET total_funds = %s / 100 WHERE id = 1",
+        (new_bank_balance,)
+    )
+    
+    return {
+        "status": "ok",
+        "message": f"Deposit successful. New balance: ₹{format_paise(new_balance)} \n Press Enter to continue",
+        "amount": amount,
+        "balance": new_balance,
+        "bank_balance": new_bank_balance
+    }
+
+
 def deposit(mobile, amount):
-    """Deposit money to user account."""
-    # Validate amount
-    try:
-        amount = decimal.Decimal(str(amount))
-    except:
-        return {"status": "error", "message": "Invalid amount format."}
+    """Deposit an amount in int paise to user account."""
+    amount, error = _check_deposit(amount)
+    if error:
+        return error
+    return _run_transaction(_deposit, "Deposit", mobile, amount)
+
+# -----------------------------
+# Transfer
+# -----------------------------
+def _check_transfer(from_mobile, to_mobile, amount):
+    """Validate a transfer of an amount in paise; return (paise, None) or (None, error result)."""
+    if not _is_paise(amount):
+        return None, {"status": "error", "message": "Invalid amount format."}
         
     if amount <= 0:
-        return {"status": "error", "message": "Deposit amount must be positive."}
+        return None, {"status": "error", "message": "Transfer amount must be positive."}
+    
+    if from_mobile == to_mobile:
+        return None, {"status": "error", "message": "Cannot transfer to the same account."}
+    
+    return amount, None
+
+
+def _transfer(transaction, from_mobile, to_mobile, amount):
+    """Transfer a validated amount between two accounts inside an open transaction."""
+    cursor = transaction.cursor
+    
+    # Lock both rows in canonical (mobile) order, so concurrent transfers
+    # in opposite directions queue on the same first row instead of deadlocking
+    balances = {}
+    for mobile in sorted((from_mobile, to_mobile)):
+        balances[mobile] = _lock_user(cursor, mobile)
+        
+        if balances[mobile] is None:
+            if mobile == from_mobile:
+                return {"status": "error", "message": "User not found."}
+            return {"status": "error", "message": "Recipient account not found."}
+    
+    # Check if sufficient balance
+    if balances[from_mobile] < amount:
+        return {"status": "error", "message": "Insufficient balance."}
+    
+    # Debit sender and credit recipient in the same transaction
+    new_balance = balances[from_mobile] - amount
+    cursor.execute(
+        "UPDATE users SET balance = %s / 100 WHERE mobile = %s",
+        (new_balance, from_mobile)
+    )
+    
+    recipient_balance = balances[to_mobile] + amount
+    cursor.execute(
+        "UPDATE users SET balance = %s / 100 WHERE mobile = %s",
+        (recipient_balance, to_mobile)
+    )
+    
+    return {
+        "status": "ok",
+        "message": f"Transfer of ₹{format_paise(amount)} to {to_mobile} successful. New balance: ₹{format_paise(new_balance)} \n Press Enter to continue",
+        "amount": amount,
+        "recipient": to_mobile,
+        "balance": new_balance,
+        "recipient_balance": recipient_balance
+    }
+
+
+def transfer(from_mobile, to_mobile, amount):
+    """Transfer an amount in int paise from one user account to another atomically."""
+    amount, error = _check_transfer(from_mobile, to_mobile, amount)
+    if error:
+        return error
+    return _run_transaction(_transfer, "Transfer", from_mobile, to_mobile, amount)
+
+# -----------------------------
+# Cassette Refill
+# -----------------------------
+def _refill(transaction, notes):
+    """Add loaded notes to the cassettes inside an open transaction."""
+    cursor = transaction.cursor
+    cursor.execute("SELECT denomination, notes FROM cassettes FOR UPDATE")
+    inventory = {row["denomination"]: row["notes"] for row in cursor.fetchall()}
+    
+    for denomination, count in notes.items():
+        if denomination not in inventory:
+            return {"status": "error", "message": f"No cassette for ₹{denomination} notes."}
+        cursor.execute(
+            "UPDATE cassettes SET notes = notes + %s WHERE denomination = %s",
+            (count, denomination)
+        )
+        inventory[denomination] += count
+    
+    return {
+        "status": "ok",
+        "message": "Cassettes refilled: " + ", ".join(
+            f"{inventory[denomination]} x ₹{denomination}" for denomination in sorted(inventory, reverse=True)
+        ),
+        "notes": inventory
+    }
+
+
+def refill_cassettes(notes):
+    """
+    Load notes into the cassettes.
+    
+    Deposited cash goes to the deposit bin and is never dispensed again, so
+    withdrawals only ever drain the cassettes; this is how an operator
+    records a replenishment. The bank's funds are unchanged, since the cash
+    was already the bank's.
+    
+    Args:
+        notes (dict): denomination -> notes loaded
+    """
+    if not notes or any(type(count) is not int or count <= 0 for count in notes.values()):
+        return {"status": "error", "message": "Refill counts must be positive whole numbers of notes."}
+    return _run_transaction(_refill, "Refill", notes)
+
+# -----------------------------
+# Batch
+# -----------------------------
+MAX_BATCH_OPERATIONS = 20
+
+def _balance(transaction, mobile):
+    """Read the account balance inside an open transaction (sees its earlier writes)."""
+    transaction.cursor.execute("SELECT CAST(balance * 100 AS SIGNED) AS balance_paise FROM users WHERE mobile = %s", (mobile,))
+    user = transaction.cursor.fetchone()
+    
+    if not user:
+        return {"status": "error", "message": "User not found."}
+    
+    balance = user["balance_paise"]
+    return {"status": "ok", "message": f"Current balance: ₹{format_paise(balance)}", "balance": balance}
+
+
+def _batch_amount(operation):
+    """Parse a batch operation's rupee amount text into paise; None if it is missing or invalid."""
+    amount = operation.get("amount")
+    if not isinstance(amount, str):
+        return None
+    try:
+        return parse_amount(amount)
+    except ValueError:
+        return None
+
+
+def _check_operation(mobile, operation):
+    """Validate one batch operation; return (handler, args, error result)."""
+    if not isinstance(operation, dict):
+        return None, None, {"status": "error", "message": "Operation must be an object."}
+    
+    name = operation.get("op")
+    if name == "withdraw":
+        amount, error = _check_withdrawal(_batch_amount(operation))
+        return _withdraw, (mobile, amount), error
+    if name == "deposit":
+        amount, error = _check_deposit(_batch_amount(operation))
+        return _deposit, (mobile, amount), error
+    if name == "transfer":
+        recipient = str(operation.get("to", ""))
+        if not recipient.isdigit() or len(recipient) < 5:
+            return None, None, {"status": "error", "message": "Invalid recipient mobile number."}
+        amount, error = _check_transfer(mobile, recipient, _batch_amount(operation))
+        return _transfer, (mobile, recipient, amount), error
+    if name == "balance":
+        return _balance, (mobile,), None
+    return None, None, {"status": "error", "message": f"Unknown operation: {name}."}
+
+
+def execute_batch(mobile, operations, atomic=True, stop_on_error=True):
+    """
+    Execute several operations for one authenticated account, in order.
+    
+    Supported operations: {"op": "withdraw"|"deposit", "amount": "500"},
+    {"op": "transfer", "to": "<mobile>", "amount": "250"} and {"op": "balance"}.
+    
+    Args:
+        mobile (str): Authenticated account the operations act on
+        operations (list): Operation objects
+        atomic (bool): Run every operation in one DB transaction that commits
+            only if all of them succeed; the first failure rolls back the
+            whole batch and skips the rest (stop_on_error is implied)
+        stop_on_error (bool): When not atomic, whether operations after a
+            failed one are skipped; each operation commits on its own
+    
+    Returns:
+        dict: 'status' ('ok', 'partial' or 'error') and 'results', one per
+        operation with its 'op', 'status' ('ok', 'error' or 'skipped') and
+        whether it was 'committed'
+    """
+    if not isinstance(operations, list) or not 1 <= len(operations) <= MAX_BATCH_OPERATIONS:
+        return {"status": "error", "message": f"A batch must contain 1 to {MAX_BATCH_OPERATIONS} operations.", "results": []}
+    
+    checked = [_check_operation(mobile, operation) for operation in operations]
+    names = [operation.get("op") if isinstance(operation, dict) else None for operation in operations]
+    
+    if atomic:
+        results = _execute_atomic(mobile, names, checked)
+    else:
+        results = _execute_each(names, checked, stop_on_error)
+    
+    succeeded = sum(1 for result in results if result["status"] == "ok" and result["committed"])
+    if succeeded == len(results):
+        status = "ok"
+    elif succeeded:
+        status = "partial"
+    else:
+        status = "error"
+    return {"status": status, "atomic": atomic, "stop_on_error": atomic or stop_on_error, "results": results}
+
+
+def _skipped(name):
+    return {"op": name, "status": "skipped", "message": "Not executed.", "committed": False}
+
+
+def _execute_atomic(mobile, names, checked):
+    """Run validated operations in a single transaction; all commit or none do."""
+    # Reject the whole batch up front if any operation is invalid
+    for index, (_, _, error) in enumerate(checked):
+        if error:
+            results = [_skipped(name) for name in names]
+            results[index] = dict(error, op=names[index], committed=False)
+            return results
     
     connection = get_db_connection()
     if not connection:
-        return {"status": "error", "message": "Database connection failed."}
+        error = {"status": "error", "message": "Database connection failed."}
+        return [dict(error, op=name, committed=False) for name in names]
     
-    cursor = connection.cursor(dictionary=True)
+    transaction = _Transaction(connection)
+    results = [_skipped(name) for name in names]
     
     try:
-        # Get user balance
-        cursor.execute("SELECT balance FROM users WHERE mobile = %s", (mobile,))
-        user = cursor.fetchone()
-        
-        if not user:
-            return {"status": "error", "message": "User not found."}
-        
-        balance = decimal.Decimal(str(user["balance"]))
-        
-        # Get bank balance
-        cursor.execute("SELECT total_funds FROM bank WHERE id = 1")
-        bank = cursor.fetchone()
-        
-        if not bank:
-            return {"status": "error", "message": "Bank data not found."}
-        
-        bank_balance = decimal.Decimal(str(bank["total_funds"]))
-        
-        # Update user balance
-        new_balance = balance + amount
-        cursor.execute(
-            "UPDATE users SET balance = %s WHERE mobile = %s",
-            (new_balance, mobile)
-        )
-        
-        # Update bank balance
-        new_bank_balance = bank_balance + amount
-        cursor.execute(
-            "UPDATE bank SET total_funds = %s WHERE id = 1",
-            (new_bank_balance,)
-        )
-        
-        connection.commit()
-        
-        return {
-            "status": "ok",
-            "message": f"Deposit successful. New balance: ₹{new_balance:.2f} \n Press Enter to continue",
-            "balance": new_balance,
-            "bank_balance": new_bank_balance
-        }
+        # Take every lock the batch needs up front in the global order (users rows by
+        # mobile, then the bank row), so later operations never lock out of order
+        accounts = {mobile}
+        accounts.update(args[1] for handler, args, _ in checked if handler is _transfer)
+        for account in sorted(accounts):
+            _lock_user(transaction.cursor, account)
+        if any(handler in (_withdraw, _deposit) for handler, _, _ in checked):
+            _lock_bank(transaction.cursor)
+        
+        for index, (handler, args, _) in enumerate(checked):
+            result = handler(transaction, *args)
+            results[index] = dict(result, op=names[index], committed=False)
+            if result["status"] != "ok":
+                transaction.rollback()
+                for done in range(index):
+                    results[done] = {
+                        "op": names[done],
+                        "status": "error",
+                        "message": "Rolled back: a later operation in the atomic batch failed.",
+                        "committed": False
+                    }
+                return results
+        
+        transaction.commit()
+        for result in results:
+            result["committed"] = True
+        return results
     except Exception as e:
-        connection.rollback()
-        return {"status": "error", "message": f"Deposit error: {str(e)}"}
+        transaction.rollback()
+        error = {"status": "error", "message": f"Batch error: {str(e)}"}
+        return [dict(error, op=name, committed=False) for name in names]
     finally:
-        cursor.close()
-        connection.close()
+        transaction.close()
+
 
+def _execute_each(names, checked, stop_on_error):
+    """Run validated operations one transaction each."""
+    labels = {_withdraw: "Withdrawal", _deposit: "Deposit", _transfer: "Transfer", _balance: "Balance"}
+    results = []
+    for index, (handler, args, error) in enumerate(checked):
+        result = error or _run_transaction(handler, labels[handler], *args)
+        results.append(dict(result, op=names[index], committed=result["status"] == "ok"))
+        if result["status"] != "ok" and stop_on_error:
+            results.extend(_skipped(name) for name in names[index + 1:])
+            break
+    return results
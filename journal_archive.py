@@ -0,0 +1,556 @@
+import argparse
+import array
+import configparser
+import datetime
+import itertools
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import zlib
+
+from logger_utils import get_logger
+from money import format_paise, parse_journal_paise
+
+# ---------------- CONFIGURATION ----------------
+config = configparser.ConfigParser()
+config.read("config.ini")
+
+# Journals are rotated once they reach this size (0 disables rotation)
+JOURNAL_MAX_BYTES = int(config.get("journal", "max_bytes", fallback=str(64 * 1024 * 1024)))
+ARCHIVE_DIR = config.get("journal", "archive_dir", fallback="journal_archive")
+
+# Live transaction journals written by db_handler
+CLIENT_TRANSACTION_FILE = "client.csv"
+BANK_TRANSACTION_FILE = "bank.csv"
+
+SEGMENT_MAGIC = b"ATMJ"
+SEGMENT_VERSION = 2
+SEGMENT_SUFFIX = ".atmj"
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+EPOCH = datetime.datetime(1970, 1, 1)
+
+# Value stored in integer columns when the journal cell is empty
+MISSING = -1
+
+# How each journal column is stored: (encoding, array typecode). Columns not
+# listed here are dictionary-encoded.
+COLUMN_ENCODINGS = {
+    "Mobile_Number": ("dictionary", "I"),
+    "Action": ("dictionary", "B"),
+    "Amount": ("paise", "q"),
+    "User_Balance": ("paise", "q"),
+    "Bank_Balance": ("paise", "q"),
+    "Timestamp": ("delta_seconds", "i"),
+    # Constant within a session: one float per session, a code per row
+    "Session_Start": ("float_dictionary", "I"),
+    "Elapsed_Time": ("centiseconds", "i"),
+}
+
+logger = get_logger("JournalArchive")
+
+
+# -----------------------------
+# Journal Identity
+# -----------------------------
+def _identity(journal):
+    """Identity of an open journal file (see stat_journal)."""
+    first_lines = b"".join(journal.readline(4096) for _ in range(2))
+    return f"{os.fstat(journal.fileno()).st_ino}:{zlib.crc32(first_lines):08x}"
+
+
+def stat_journal(path):
+    """
+    Return (identity, size) of a journal, read from one open file.
+
+    The identity survives the rename into the archive but not replacement.
+    The inode alone is not enough, since the inode of a deleted segment is
+    soon reused by a new journal. It is combined with a checksum of the
+    header and first row, whose timestamps make it unique per journal.
+
+    Returns:
+        tuple: (identity, size), or (None, 0) if the journal does not exist
+    """
+    try:
+        with open(path, "rb") as journal:
+            return _identity(journal), os.fstat(journal.fileno()).st_size
+    except OSError:
+        return None, 0
+
+
+# -----------------------------
+# Rotation
+# -----------------------------
+def _segment_pattern(journal_path):
+    stem = os.path.splitext(os.path.basename(journal_path))[0]
+    return re.compile(re.escape(stem) + r"-(\d+)(\.csv|" + re.escape(SEGMENT_SUFFIX) + r")$")
+
+
+def segment_paths(journal_path, archive_dir=ARCHIVE_DIR):
+    """
+    List the closed segments of a journal, oldest first.
+
+    A segment is a rotated '<stem>-<sequence>.csv' until the archiver has
+    converted it to '<stem>-<sequence>.atmj'; if both exist (a conversion in
+    progress) the columnar file is returned.
+    """
+    if not os.path.isdir(archive_dir):
+        return []
+    pattern = _segment_pattern(journal_path)
+    segments = {}
+    for name in os.listdir(archive_dir):
+        match = pattern.match(name)
+        if match and (match.group(2) == SEGMENT_SUFFIX or int(match.group(1)) not in segments):
+            segments[int(match.group(1))] = os.path.join(archive_dir, name)
+    return [segments[sequence] for sequence in sorted(segments)]
+
+
+def rotate_journal(journal_path, max_bytes=JOURNAL_MAX_BYTES, archive_dir=ARCHIVE_DIR):
+    """
+    Move a journal into the archive directory once it reaches max_bytes.
+
+    Must be called with the journal's writers excluded (db_handler holds its
+    journal lock). The next write starts a fresh journal with a new header.
+
+    Returns:
+        str: Path of the closed segment, or None if the journal was not rotated
+    """
+    if not max_bytes or not os.path.isfile(journal_path) or os.path.getsize(journal_path) < max_bytes:
+        return None
+
+    os.makedirs(archive_dir, exist_ok=True)
+    pattern = _segment_pattern(journal_path)
+    sequences = [int(match.group(1)) for match in map(pattern.match, os.listdir(archive_dir)) if match]
+    stem = os.path.splitext(os.path.basename(journal_path))[0]
+    segment_path = os.path.join(archive_dir, f"{stem}-{max(sequences, default=0) + 1:06d}.csv")
+    os.replace(journal_path, segment_path)
+    logger.info(f"Rotated {journal_path} to {segment_path}")
+    return segment_path
+
+
+# -----------------------------
+# Columnar Encoding
+# -----------------------------
+def _encode_column(encoding, typecode, cells):
+    """Encode one column of text cells; return (values array, footer metadata)."""
+    meta = {"encoding": encoding, "typecode": typecode}
+
+    if encoding == "dictionary":
+        dictionary, codes = [], {}
+        values = array.array(typecode)
+        for cell in cells:
+            code = codes.get(cell)
+            if code is None:
+                code = codes[cell] = len(dictionary)
+                dictionary.append(cell)
+            values.append(code)
+        meta["dictionary"] = dictionary
+    elif encoding == "float_dictionary":
+        # The dictionary is written as a float64 array after the codes (see write_segment)
+        dictionary, codes = array.array("d"), {}
+        values = array.array(typecode)
+        for cell in cells:
+            code = codes.get(cell)
+            if code is None:
+                code = codes[cell] = len(dictionary)
+                dictionary.append(float(cell) if cell else math.nan)
+            values.append(code)
+        meta["dictionary"] = dictionary
+    elif encoding == "paise":
+        try:
+            values = array.array(typecode, (parse_journal_paise(cell) if cell else MISSING for cell in cells))
+        except ValueError:
+            # A cell that is not an amount at all: keep this column's text as is
+            return _encode_column("dictionary", "I", cells)
+    elif encoding == "delta_seconds":
+        seconds = [int((datetime.datetime.strptime(cell, TIMESTAMP_FORMAT) - EPOCH).total_seconds()) for cell in cells]
+        meta["base"] = seconds[0] if seconds else 0
+        values = array.array(typecode, (current - previous for previous, current in zip([meta["base"]] + seconds, seconds)))
+    elif encoding == "centiseconds":
+        values = array.array(typecode, (round(float(cell) * 100) if cell else MISSING for cell in cells))
+    else:
+        raise ValueError(f"Unknown column encoding: {encoding}")
+    return values, meta
+
+
+def _decode_column(meta, values, dictionary=None):
+    """Turn a stored column back into the text cells of the original journal."""
+    encoding = meta["encoding"]
+    if encoding == "dictionary":
+        dictionary = meta["dictionary"]
+        return [dictionary[code] for code in values]
+    if encoding == "float_dictionary":
+        return ["" if math.isnan(dictionary[code]) else repr(dictionary[code]) for code in values]
+    if encoding == "paise":
+        return ["" if value == MISSING else format_paise(value) for value in values]
+    if encoding == "delta_seconds":
+        return [(EPOCH + datetime.timedelta(seconds=value)).strftime(TIMESTAMP_FORMAT) for value in values]
+    if encoding == "centiseconds":
+        return ["" if value == MISSING else f"{value / 100:.2f}" for value in values]
+    raise ValueError(f"Unknown column encoding: {encoding}")
+
+
+def _write_aligned(segment_file, values):
+    """Write an array as little-endian values at an 8-byte boundary; return its offset."""
+    padding = -segment_file.tell() % 8
+    segment_file.write(b"\0" * padding)
+    offset = segment_file.tell()
+    if sys.byteorder == "big":
+        values = array.array(values.typecode, values)
+        values.byteswap()
+    segment_file.write(values.tobytes())
+    return offset
+
+
+def write_segment(csv_path, segment_path):
+    """
+    Convert a closed tab-separated journal segment into the columnar format.
+
+    Layout: magic and version, then one little-endian fixed-width array per
+    column (8-byte aligned so readers can map them in place), then a JSON
+    footer followed by its length and the magic again. The footer holds the
+    column dictionaries, the timestamp base and the segment's time and mobile
+    ranges for skipping; session start times are the exception, with their
+    distinct values stored as a float array right after the column's codes.
+    The original line lengths are kept as a last array so byte offsets into
+    the CSV can still be resolved to rows.
+    """
+    with open(csv_path, "rb") as journal:
+        source_identity = _identity(journal)
+        journal.seek(0)
+        header_line = journal.readline()
+        header = header_line.decode().rstrip("\r\n").split("\t")
+        columns = [[] for _ in header]
+        line_lengths = []
+        for line in journal:
+            if not line.endswith(b"\n"):
+                break  # Partial write at the end of the segment
+            if not line.strip():
+                # Blank lines are not rows; fold their bytes into the previous line
+                if line_lengths:
+                    line_lengths[-1] += len(line)
+                else:
+                    header_line += line
+                continue
+            line_lengths.append(len(line))
+            cells = line.decode().rstrip("\r\n").split("\t")
+            for position, column in enumerate(columns):
+                column.append(cells[position] if position < len(cells) else "")
+
+    footer = {
+        "header": header,
+        "rows": len(line_lengths),
+        "source_identity": source_identity,
+        "header_bytes": len(header_line),
+        "columns": {},
+    }
+    index = {name: position for position, name in enumerate(header)}
+    if line_lengths and "Timestamp" in index:
+        timestamps = columns[index["Timestamp"]]
+        footer["min_timestamp"], footer["max_timestamp"] = min(timestamps), max(timestamps)
+    if line_lengths and "Mobile_Number" in index:
+        mobiles = columns[index["Mobile_Number"]]
+        footer["min_mobile"], footer["max_mobile"] = min(mobiles), max(mobiles)
+
+    temp_path = f"{segment_path}.tmp"
+    with open(temp_path, "wb") as segment_file:
+        segment_file.write(struct.pack("<4sHH", SEGMENT_MAGIC, SEGMENT_VERSION, 0))
+        for name, cells in zip(header, columns):
+            encoding, typecode = COLUMN_ENCODINGS.get(name, ("dictionary", "I"))
+            values, meta = _encode_column(encoding, typecode, cells)
+            meta["offset"] = _write_aligned(segment_file, values)
+            if encoding == "float_dictionary":
+                dictionary = meta["dictionary"]
+                meta["dictionary"] = {"offset": _write_aligned(segment_file, dictionary), "length": len(dictionary)}
+            footer["columns"][name] = meta
+
+        lengths_typecode = "H" if max(line_lengths, default=0) <= 0xFFFF else "I"
+        lengths = array.array(lengths_typecode, line_lengths)
+        footer["line_lengths"] = {"typecode": lengths_typecode, "offset": _write_aligned(segment_file, lengths)}
+
+        encoded_footer = json.dumps(footer, separators=(",", ":")).encode()
+        segment_file.write(encoded_footer)
+        segment_file.write(struct.pack("<I4s", len(encoded_footer), SEGMENT_MAGIC))
+    os.replace(temp_path, segment_path)
+
+
+def archive_segment(csv_path):
+    """Convert one rotated CSV segment and remove it; return the columnar path."""
+    segment_path = os.path.splitext(csv_path)[0] + SEGMENT_SUFFIX
+    write_segment(csv_path, segment_path)
+    try:
+        os.remove(csv_path)
+    except FileNotFoundError:
+        pass  # Converted concurrently by another archiver
+    logger.info(f"Archived {csv_path} to {segment_path} ({os.path.getsize(segment_path)} bytes)")
+    return segment_path
+
+
+def archive_pending(archive_dir=ARCHIVE_DIR):
+    """Convert every rotated CSV segment still waiting in the archive directory."""
+    if not os.path.isdir(archive_dir):
+        return []
+    archived = []
+    for name in sorted(os.listdir(archive_dir)):
+        if name.endswith(".csv"):
+            try:
+                archived.append(archive_segment(os.path.join(archive_dir, name)))
+            except (OSError, ValueError) as e:
+                logger.error(f"Failed to archive {name}: {e}")
+    return archived
+
+
+def recover_archive(archive_dir=ARCHIVE_DIR):
+    """
+    Finish conversions interrupted by a shutdown or crash; call before any archiver runs.
+
+    Background archivers run on daemon threads, so exiting mid-conversion
+    leaves the rotated CSV in place next to a partial '.atmj.tmp'. The
+    partial files are removed and the CSV segments converted again.
+    """
+    if not os.path.isdir(archive_dir):
+        return []
+    for name in os.listdir(archive_dir):
+        if name.endswith(".tmp"):
+            os.remove(os.path.join(archive_dir, name))
+            logger.info(f"Removed partial segment {name}")
+    return archive_pending(archive_dir)
+
+
+def archive_in_background(csv_path):
+    """Convert a freshly rotated segment without holding up the writer."""
+    def run():
+        try:
+            archive_segment(csv_path)
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to archive {csv_path}: {e}")
+
+    threading.Thread(target=run, daemon=True, name="JournalArchiver").start()
+
+
+# -----------------------------
+# Memory-mapped Reader
+# -----------------------------
+class Segment:
+    """
+    Read-only view of a columnar journal segment.
+
+    The file is memory-mapped and columns are exposed as memoryviews over
+    the mapping, so only the pages of the columns actually read are loaded.
+    Views returned by raw() must be released before close().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as segment_file:
+            self.map = mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, _ = struct.unpack_from("<4sHH", self.map, 0)
+        footer_length, trailer_magic = struct.unpack_from("<I4s", self.map, len(self.map) - 8)
+        if magic != SEGMENT_MAGIC or trailer_magic != SEGMENT_MAGIC or version != SEGMENT_VERSION:
+            self.map.close()
+            raise ValueError(f"{path} is not a journal segment")
+
+        footer_start = len(self.map) - 8 - footer_length
+        self.footer = json.loads(self.map[footer_start:footer_start + footer_length])
+        self.header = self.footer["header"]
+        self.rows = self.footer["rows"]
+
+    def close(self):
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _view(self, typecode, offset, length=None):
+        size = array.array(typecode).itemsize * (self.rows if length is None else length)
+        if sys.byteorder == "little":
+            return memoryview(self.map)[offset:offset + size].cast(typecode)
+        values = array.array(typecode, self.map[offset:offset + size])
+        values.byteswap()
+        return values
+
+    def raw(self, name):
+        """Stored values of a column (dictionary codes, paise, timestamp deltas, ...)."""
+        meta = self.footer["columns"][name]
+        return self._view(meta["typecode"], meta["offset"])
+
+    def timestamps(self):
+        """Decode the Timestamp column into seconds since the (naive) epoch."""
+        base = self.footer["columns"]["Timestamp"]["base"]
+        return list(itertools.accumulate(self.raw("Timestamp"), initial=base))[1:]
+
+    def overlaps(self, start=None, end=None):
+        """Whether any row may fall in [start, end] ('YYYY-MM-DD HH:MM:SS' strings)."""
+        if not self.rows:
+            return False
+        return ((start is None or self.footer["max_timestamp"] >= start) and
+                (end is None or self.footer["min_timestamp"] <= end))
+
+    def may_contain(self, mobile):
+        """Whether the segment has rows for a mobile number."""
+        if not self.rows or not self.footer["min_mobile"] <= mobile <= self.footer["max_mobile"]:
+            return False
+        return mobile in self.footer["columns"]["Mobile_Number"]["dictionary"]
+
+    def row_at_offset(self, offset):
+        """Map a byte offset in the original CSV to the index of the first row at or after it."""
+        meta = self.footer["line_lengths"]
+        position, row = self.footer["header_bytes"], 0
+        for length in self._view(meta["typecode"], meta["offset"]):
+            if position >= offset:
+                break
+            position += length
+            row += 1
+        return row
+
+    def text_rows(self, start_row=0, chunk_rows=65536, end_offset=None):
+        """
+        Yield the segment's rows as split text lines, as the CSV reader would.
+
+        Rows not complete by end_offset, a byte offset in the original CSV,
+        are left out, as the CSV reader leaves out a partial last line.
+
+        Yields:
+            tuple: (lines, end_offset) where lines holds up to chunk_rows rows,
+            each a list of cells in header order, and end_offset is the byte
+            offset just past them in the original CSV
+        """
+        seconds = self.timestamps() if "Timestamp" in self.footer["columns"] else None
+        meta = self.footer["line_lengths"]
+        lengths = array.array(meta["typecode"], self._view(meta["typecode"], meta["offset"]))
+        position = self.footer["header_bytes"] + sum(lengths[:start_row])
+        stop_row = self.rows
+        if end_offset is not None:
+            stop_row, stop = start_row, position
+            while stop_row < self.rows and stop + lengths[stop_row] <= end_offset:
+                stop += lengths[stop_row]
+                stop_row += 1
+        for first in range(start_row, stop_row, chunk_rows):
+            last = min(first + chunk_rows, stop_row)
+            position += sum(lengths[first:last])
+            yield self._decode_rows(range(first, last), seconds), position
+
+    def _decode_rows(self, rows, seconds):
+        """Decode the given row indexes into lists of text cells."""
+        cells = []
+        for name in self.header:
+            meta = self.footer["columns"][name]
+            values = seconds if meta["encoding"] == "delta_seconds" else self.raw(name)
+            dictionary = None
+            if meta["encoding"] == "float_dictionary":
+                dictionary = self._view("d", meta["dictionary"]["offset"], meta["dictionary"]["length"])
+            cells.append(_decode_column(meta, [values[row] for row in rows], dictionary))
+        return [list(row) for row in zip(*cells)]
+
+    def query(self, start=None, end=None, mobile=None):
+        """Yield rows (as dicts of text cells) matching a time range and/or mobile number."""
+        if not self.overlaps(start, end) or (mobile is not None and not self.may_contain(mobile)):
+            return
+        for row in self._decode_rows(*self._select(start, end, mobile)):
+            yield dict(zip(self.header, row))
+
+    def _select(self, start, end, mobile):
+        """Return (matching row indexes, decoded timestamps) for a query."""
+        seconds = self.timestamps() if "Timestamp" in self.footer["columns"] else None
+        selected = range(self.rows)
+        if mobile is not None:
+            code = self.footer["columns"]["Mobile_Number"]["dictionary"].index(mobile)
+            codes = self.raw("Mobile_Number")
+            selected = [row for row in selected if codes[row] == code]
+        if start is not None or end is not None:
+            low = int((datetime.datetime.strptime(start, TIMESTAMP_FORMAT) - EPOCH).total_seconds()) if start else None
+            high = int((datetime.datetime.strptime(end, TIMESTAMP_FORMAT) - EPOCH).total_seconds()) if end else None
+            selected = [row for row in selected
+                        if (low is None or seconds[row] >= low) and (high is None or seconds[row] <= high)]
+        return selected, seconds
+
+
+def segment_identity(path):
+    """Identity of the live journal a closed segment was rotated from."""
+    if path.endswith(SEGMENT_SUFFIX):
+        with Segment(path) as segment:
+            return segment.footer["source_identity"]
+    return stat_journal(path)[0]
+
+
+def rotated_segments(journal_path, identity, offset, archive_dir=ARCHIVE_DIR):
+    """
+    Find the closed segments holding rows not yet read by a checkpoint.
+
+    Args:
+        journal_path (str): Live journal the checkpoint refers to
+        identity: Journal identity saved in the checkpoint (None if the
+            journal did not exist yet, meaning every segment is unread)
+        offset (int): Byte offset reached in that journal
+
+    Returns:
+        list: (segment path, byte offset to resume from) pairs, oldest first;
+        empty if the checkpoint's journal is not in the archive
+    """
+    paths = segment_paths(journal_path, archive_dir)
+    if identity is None:
+        return [(path, 0) for path in paths]
+    for position, path in enumerate(paths):
+        if segment_identity(path) == identity:
+            return [(path, offset)] + [(later, 0) for later in paths[position + 1:]]
+    return []
+
+
+def checkpoint_resolves(journal_path, checkpoint, archive_dir=ARCHIVE_DIR):
+    """
+    Whether a checkpoint points into the live journal or one of its archived segments.
+
+    A checkpoint that resolves to neither (its journal was deleted, or it was
+    saved while the journal was missing mid-rotation) says nothing about
+    which rows it covers.
+    """
+    if checkpoint["identity"] is None:
+        return False
+    identity, size = stat_journal(journal_path)
+    if checkpoint["identity"] == identity:
+        return checkpoint["offset"] <= size
+    return bool(rotated_segments(journal_path, checkpoint["identity"], checkpoint["offset"], archive_dir))
+
+
+def query_archive(journal_path, start=None, end=None, mobile=None, archive_dir=ARCHIVE_DIR):
+    """Yield archived rows of a journal matching a time range and/or mobile, skipping segments by footer."""
+    for path in segment_paths(journal_path, archive_dir):
+        if not path.endswith(SEGMENT_SUFFIX):
+            continue  # Not converted yet
+        with Segment(path) as segment:
+            yield from segment.query(start, end, mobile)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive rotated transaction journals and query the archive.")
+    parser.add_argument("command", choices=["archive", "info", "query"])
+    parser.add_argument("--journal", default=CLIENT_TRANSACTION_FILE, help="Journal whose segments to inspect")
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    parser.add_argument("--mobile", help="Only rows for this mobile number")
+    parser.add_argument("--from", dest="start", help="Earliest timestamp, 'YYYY-MM-DD HH:MM:SS'")
+    parser.add_argument("--to", dest="end", help="Latest timestamp, 'YYYY-MM-DD HH:MM:SS'")
+    args = parser.parse_args()
+
+    if args.command == "archive":
+        for path in archive_pending(args.archive_dir):
+            print(path)
+    elif args.command == "info":
+        for path in segment_paths(args.journal, args.archive_dir):
+            if not path.endswith(SEGMENT_SUFFIX):
+                print(f"{path}: awaiting conversion ({os.path.getsize(path)} bytes)")
+                continue
+            with Segment(path) as segment:
+                footer = segment.footer
+                print(f"{path}: {segment.rows} rows, {os.path.getsize(path)} bytes, "
+                      f"{footer.get('min_timestamp', '-')} .. {footer.get('max_timestamp', '-')}")
+    else:
+        for row in query_archive(args.journal, args.start, args.end, args.mobile, args.archive_dir):
+            print("\t".join(row.values()))
@@ -0,0 +1,117 @@
+import decimal
+
+# -----------------------------
+# Limits
+# -----------------------------
+# Widest money column is bank.total_funds DECIMAL(15, 2)
+MAX_PAISE = 10 ** 15 - 1
+# users.balance is DECIMAL(10, 2); no single amount may exceed what an account can hold
+MAX_ACCOUNT_PAISE = 10 ** 10 - 1
+
+
+# -----------------------------
+# Parsing
+# -----------------------------
+def parse_paise(text, max_paise=MAX_PAISE, allow_negative=False):
+    """
+    Parse a decimal rupee string into integer paise without going through float.
+
+    Accepts plain ASCII digits with at most two decimal places, e.g. '100',
+    '100.5' or '100.50'. Exponents, signs (unless allow_negative), whitespace
+    inside the number, 'nan' and 'inf' are all rejected.
+
+    Args:
+        text (str): Amount to parse
+        max_paise (int): Largest accepted magnitude in paise
+        allow_negative (bool): Whether a leading '-' is accepted
+
+    Returns:
+        int: Amount in paise
+
+    Raises:
+        ValueError: If the text is not a valid amount or is out of range
+    """
+    if text.isdigit() and text.isascii():
+        # Fast path: whole rupees, the common case for ATM input
+        paise = int(text) * 100
+        if paise > max_paise:
+            raise ValueError(f"Amount out of range: {text!r}")
+        return paise
+
+    text = text.strip()
+    negative = text.startswith("-")
+    if negative:
+        if not allow_negative:
+            raise ValueError(f"Negative amount not allowed: {text!r}")
+        text = text[1:]
+
+    whole, dot, fraction = text.partition(".")
+    if not whole or not (whole.isascii() and whole.isdigit()):
+        raise ValueError(f"Invalid amount: {text!r}")
+    if dot and not (1 <= len(fraction) <= 2 and fraction.isascii() and fraction.isdigit()):
+        raise ValueError(f"Amount must have at most 2 decimal places: {text!r}")
+
+    paise = int(whole) * 100 + (int(fraction.ljust(2, "0")) if fraction else 0)
+    if paise > max_paise:
+        raise ValueError(f"Amount out of range: {text!r}")
+    return -paise if negative else paise
+
+
+def parse_journal_paise(text):
+    """
+    Parse an amount read back from a journal into paise, rounding extra decimals.
+
+    Journals written before amounts were kept in paise can hold values such
+    as '100.555' or '1e3', which parse_paise rejects as user input. They are
+    rounded half away from zero, as MySQL rounds them into a DECIMAL column.
+
+    Raises:
+        ValueError: If the text is not a finite number or is out of range
+    """
+    try:
+        return parse_paise(text, allow_negative=True)
+    except ValueError:
+        pass
+    try:
+        paise = int(decimal.Decimal(text.strip()).scaleb(2).quantize(1, rounding=decimal.ROUND_HALF_UP))
+    except (decimal.DecimalException, ValueError, OverflowError):
+        # Not a number, nan, inf, or too large to quantize
+        raise ValueError(f"Invalid amount: {text!r}") from None
+    if abs(paise) > MAX_PAISE:
+        raise ValueError(f"Amount out of range: {text!r}")
+    return paise
+
+
+def parse_amount(text):
+    """Parse user input such as '500' or '99.50' into paise, capped at what an account can hold."""
+    return parse_paise(text, MAX_ACCOUNT_PAISE)
+
+
+def paise_from_db(value):
+    """Convert a DECIMAL column value (Decimal, int or str) read from MySQL into paise."""
+    if isinstance(value, int):
+        return value * 100
+    if isinstance(value, decimal.Decimal):
+        return int(value.scaleb(2).to_integral_exact())
+    return parse_paise(str(value), allow_negative=True)
+
+
+def rupees(amount):
+    """Return a whole number of rupees in paise."""
+    return amount * 100
+
+
+# -----------------------------
+# Formatting
+# -----------------------------
+def format_paise(paise):
+    """
+    Format paise as rupees with exactly two decimals, e.g. 1050 -> '10.50'.
+
+    Amounts stay plain ints from parsing until they are written to the
+    socket, the journals or the database; this is the only place they are
+    turned back into text.
+    """
+    if paise < 0:
+        return "-%d.%02d" % divmod(-paise, 100)
+    return "%d.%02d" % divmod(paise, 100)
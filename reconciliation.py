@@ -0,0 +1,349 @@
+import argparse
+import configparser
+import json
+import os
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from db_handler import INITIAL_BALANCE, get_db_connection
+from journal_archive import CLIENT_TRANSACTION_FILE, BANK_TRANSACTION_FILE, stat_journal
+from money import paise_from_db
+from transaction_report import CHUNK_SIZE, MISSING, stream_new_rows, to_paise
+
+# ---------------- CONFIGURATION ----------------
+config = configparser.ConfigParser()
+config.read("config.ini")
+
+RECONCILE_STATE_FILE = config.get("reconciliation", "state_file", fallback="reconcile_state.json")
+RECONCILE_WORKERS = int(config.get("reconciliation", "workers", fallback="1"))
+MAX_REPORTED = int(config.get("reconciliation", "max_reported", fallback="1000"))
+# Journal rows a row may wait for an earlier, later-journaled row before it is reported
+REORDER_WINDOW = int(config.get("reconciliation", "reorder_window", fallback="256"))
+
+# Signed effect of each journaled action on the account balance
+BALANCE_EFFECTS = {"withdraw": -1, "deposit": 1, "transfer_out": -1, "transfer_in": 1}
+
+
+# -----------------------------
+# Replay
+# -----------------------------
+def partition_of(mobile, partitions):
+    """Return the stable partition index for a mobile number."""
+    return zlib.crc32(mobile.encode()) % partitions
+
+
+def _settle(chain):
+    """Apply pending rows that continue a [balance, rows, pending] chain, in whatever order they fit."""
+    pending = chain[2]
+    progress = True
+    while pending and progress:
+        progress = False
+        for position, (_, _, action, amount, journaled, _) in enumerate(pending):
+            if journaled - BALANCE_EFFECTS[action] * amount == chain[0]:
+                chain[0] = journaled
+                chain[1] += 1
+                del pending[position]
+                progress = True
+                break
+
+
+def _expire(chains, waiting, horizon, scope, discrepancies):
+    """Report pending rows journaled at or before horizon whose predecessor never arrived."""
+    while waiting and waiting[0][0] <= horizon:
+        sequence, key = waiting.popleft()
+        chain = chains[key]
+        if not chain[2] or chain[2][0][0] != sequence:
+            continue  # Settled since it was queued
+        _, mobile, action, amount, journaled, timestamp = chain[2].pop(0)
+        discrepancies.append({
+            "scope": scope,
+            "mobile": mobile,
+            "action": action,
+            "timestamp": timestamp,
+            "expected": chain[0] + BALANCE_EFFECTS[action] * amount,
+            "journaled": journaled,
+        })
+        # Continue from the journaled balance so one bad row is reported once
+        chain[0] = journaled
+        chain[1] += 1
+        _settle(chain)
+
+
+def replay_chains(chains, rows, scope, window=REORDER_WINDOW):
+    """
+    Replay journal rows against running balance chains.
+
+    Each money-moving row must leave its chain at exactly the previous
+    balance plus or minus the amount. Rows are journaled after their
+    transaction commits, so concurrent sessions can write them out of
+    commit order: a row that does not continue its chain waits until the
+    rows before it arrive, and is only reported once window further journal
+    rows have gone by without that happening.
+
+    Args:
+        chains (dict): key -> [balance_paise, rows_replayed, pending_rows], updated
+            in place. Account chains are keyed by mobile and start at the
+            registration balance; the bank chain is keyed "bank" and opens from
+            its first row, since the bank row itself is never journaled.
+        rows (list): (sequence, mobile, action, amount_paise, balance_paise, timestamp) tuples
+        scope (str): "account" or "bank"
+        window (int): Journal rows a row may wait for an earlier one
+
+    Returns:
+        list: Discrepancies found
+    """
+    discrepancies = []
+    waiting = deque(sorted((row[0], key) for key, chain in chains.items() for row in chain[2]))
+    for row in rows:
+        _expire(chains, waiting, row[0] - window, scope, discrepancies)
+        key = row[1] if scope == "account" else "bank"
+        chain = chains.get(key)
+        if chain is None:
+            opening = INITIAL_BALANCE if scope == "account" else row[4] - BALANCE_EFFECTS[row[2]] * row[3]
+            chain = chains[key] = [opening, 0, []]
+        chain[2].append(row)
+        waiting.append((row[0], key))
+        _settle(chain)
+    return discrepancies
+
+
+def money_rows(header, lines, balance_column, sequence, partition=0, partitions=1):
+    """
+    Extract money-moving rows from split journal lines.
+
+    Rows are numbered from sequence by their position in the journal, and
+    only mobiles in the given hash partition are kept.
+    """
+    index = {name: position for position, name in enumerate(header)}
+    mobile_at, action_at = index["Mobile_Number"], index["Action"]
+    amount_at, balance_at, time_at = index["Amount"], index[balance_column], index["Timestamp"]
+
+    rows = []
+    for line in lines:
+        sequence += 1
+        if len(line) <= max(amount_at, balance_at, time_at):
+            continue
+        action = line[action_at]
+        if action not in BALANCE_EFFECTS:
+            continue
+        if partitions > 1 and partition_of(line[mobile_at], partitions) != partition:
+            continue
+        amount, balance = to_paise(line[amount_at]), to_paise(line[balance_at])
+        if amount == MISSING or balance == MISSING:
+            continue
+        rows.append((sequence, line[mobile_at], action, amount, balance, line[time_at]))
+    return rows
+
+
+# -----------------------------
+# Checkpointed State
+# -----------------------------
+def empty_state():
+    """Return a fresh reconciliation state."""
+    return {
+        "journals": {},
+        "sequences": {},
+        "accounts": {},
+        "bank": {},
+        "discrepancy_count": 0,
+        "discrepancies": [],
+    }
+
+
+def load_state(path=RECONCILE_STATE_FILE):
+    """Load the last reconciliation checkpoint, or a fresh state."""
+    if os.path.isfile(path):
+        with open(path) as state_file:
+            return json.load(state_file)
+    return empty_state()
+
+
+def save_state(state, path=RECONCILE_STATE_FILE):
+    """Atomically write the reconciliation checkpoint."""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as state_file:
+        json.dump(state, state_file)
+    os.replace(temp_path, path)
+
+
+def _record(state, discrepancies, count=None):
+    state["discrepancy_count"] += len(discrepancies) if count is None else count
+    state["discrepancies"].extend(discrepancies)
+    del state["discrepancies"][:-MAX_REPORTED]
+
+
+# -----------------------------
+# Reconciliation
+# -----------------------------
+def replay_client_partition(path, checkpoint, sequence, accounts, partition=0, partitions=1,
+                            chunk_size=CHUNK_SIZE, end=None):
+    """
+    Replay one hash partition of the client journal's accounts.
+
+    Runs in a worker process: each worker streams and splits the whole
+    journal itself and keeps only the rows of its own partition, so only the
+    amount parsing and chain replay are spread across workers, and only the
+    partition's account state crosses the process boundary. Every worker
+    stops at the same end, so all of them replay the same rows and return
+    the same checkpoint.
+
+    Returns:
+        tuple: (accounts, discrepancy count, last MAX_REPORTED discrepancies, checkpoint, sequence)
+    """
+    count, reported = 0, []
+    for header, lines, checkpoint in stream_new_rows(path, checkpoint, chunk_size, end=end):
+        rows = money_rows(header, lines, "User_Balance", sequence, partition, partitions)
+        sequence += len(lines)
+        discrepancies = replay_chains(accounts, rows, "account")
+        count += len(discrepancies)
+        reported.extend(discrepancies)
+        del reported[:-MAX_REPORTED]
+    return accounts, count, reported, checkpoint, sequence
+
+
+def replay_client_journal(state, path, workers=1, chunk_size=CHUNK_SIZE):
+    """Replay new client journal rows, optionally partitioned by mobile across worker processes."""
+    checkpoint = state["journals"].get(path)
+    sequence = state["sequences"].get(path, 0)
+    # Workers start at different times while the journal keeps growing; one
+    # stat here fixes where all of them stop
+    identity, size = stat_journal(path)
+
+    if workers <= 1 or identity is None:
+        results = [replay_client_partition(path, checkpoint, sequence, state["accounts"], chunk_size=chunk_size)]
+    else:
+        owned = [{} for _ in range(workers)]
+        for mobile, chain in state["accounts"].items():
+            owned[partition_of(mobile, workers)][mobile] = chain
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(replay_client_partition, path, checkpoint, sequence, owned[partition],
+                                partition, workers, chunk_size, {"identity": identity, "offset": size})
+                for partition in range(workers)
+            ]
+            results = [future.result() for future in futures]
+
+    for accounts, count, discrepancies, checkpoint, sequence in results:
+        state["accounts"].update(accounts)
+        _record(state, discrepancies, count)
+    if checkpoint is not None:
+        state["journals"][path] = checkpoint
+        state["sequences"][path] = sequence
+
+
+def replay_bank_journal(state, path, chunk_size=CHUNK_SIZE):
+    """Replay new bank journal rows against the running bank balance."""
+    checkpoint = state["journals"].get(path)
+    sequence = state["sequences"].get(path, 0)
+    for header, lines, checkpoint in stream_new_rows(path, checkpoint, chunk_size):
+        _record(state, replay_chains(state["bank"], money_rows(header, lines, "Bank_Balance", sequence), "bank"))
+        sequence += len(lines)
+    if checkpoint is not None:
+        state["journals"][path] = checkpoint
+        state["sequences"][path] = sequence
+
+
+def compare_with_database(state):
+    """
+    Compare replayed balances with the users and bank tables.
+
+    Returns:
+        list: Discrepancies between the journals and the database, or None if
+        the database is unavailable
+    """
+    connection = get_db_connection()
+    if not connection:
+        return None
+
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT mobile, balance FROM users")
+        stored = {row["mobile"]: paise_from_db(row["balance"]) for row in cursor.fetchall()}
+        cursor.execute("SELECT total_funds FROM bank WHERE id = 1")
+        bank = cursor.fetchone()
+    finally:
+        cursor.close()
+        connection.close()
+
+    discrepancies = []
+    for mobile, (balance, _, pending) in state["accounts"].items():
+        if pending:
+            continue  # Waiting for rows not journaled yet; the balance is not final
+        if mobile not in stored:
+            discrepancies.append({"scope": "account", "mobile": mobile, "expected": balance, "stored": None})
+        elif stored[mobile] != balance:
+            discrepancies.append({"scope": "account", "mobile": mobile, "expected": balance, "stored": stored[mobile]})
+
+    bank_balance, _, pending = state["bank"].get("bank", (None, 0, ()))
+    if bank and bank_balance is not None and not pending:
+        stored_bank = paise_from_db(bank["total_funds"])
+        if stored_bank != bank_balance:
+            discrepancies.append({"scope": "bank", "expected": bank_balance, "stored": stored_bank})
+    return discrepancies
+
+
+def reconcile(client_file=CLIENT_TRANSACTION_FILE, bank_file=BANK_TRANSACTION_FILE,
+              state_file=RECONCILE_STATE_FILE, workers=RECONCILE_WORKERS, reset=False,
+              check_database=True, chunk_size=CHUNK_SIZE):
+    """
+    Incrementally replay the journals and report ledger drift.
+
+    Returns:
+        dict: 'state' (the saved checkpoint) and 'database' (journal vs.
+        database discrepancies, or None when not checked)
+    """
+    state = empty_state() if reset else load_state(state_file)
+    replay_client_journal(state, client_file, workers, chunk_size)
+    replay_bank_journal(state, bank_file, chunk_size)
+    save_state(state, state_file)
+
+    database = compare_with_database(state) if check_database else None
+    return {"state": state, "database": database}
+
+
+def _rupees(paise):
+    return "-" if paise is None else f"₹{paise / 100:,.2f}"
+
+
+def format_discrepancies(result):
+    """Render a reconciliation result as plain text."""
+    state = result["state"]
+    chains = list(state["accounts"].values()) + list(state["bank"].values())
+    lines = [
+        f"Accounts replayed: {len(state['accounts'])} | "
+        f"Bank rows replayed: {state['bank']['bank'][1] if state['bank'] else 0} | "
+        f"Rows awaiting earlier rows: {sum(len(chain[2]) for chain in chains)}",
+        f"Journal discrepancies: {state['discrepancy_count']}",
+    ]
+    for item in state["discrepancies"]:
+        lines.append(
+            f"  [{item['scope']}] {item['timestamp']} {item['mobile']} {item['action']}: "
+            f"expected {_rupees(item['expected'])}, journaled {_rupees(item['journaled'])}"
+        )
+
+    if result["database"] is None:
+        lines.append("Database comparison: skipped")
+    else:
+        lines.append(f"Database discrepancies: {len(result['database'])}")
+        for item in result["database"]:
+            label = item.get("mobile", "bank")
+            lines.append(f"  [{item['scope']}] {label}: expected {_rupees(item['expected'])}, stored {_rupees(item['stored'])}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconcile the transaction journals against the database.")
+    parser.add_argument("--client-file", default=CLIENT_TRANSACTION_FILE)
+    parser.add_argument("--bank-file", default=BANK_TRANSACTION_FILE)
+    parser.add_argument("--state-file", default=RECONCILE_STATE_FILE)
+    parser.add_argument("--workers", type=int, default=RECONCILE_WORKERS,
+                        help="Worker processes; accounts are partitioned by mobile number")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--reset", action="store_true", help="Discard the checkpoint and replay from scratch")
+    parser.add_argument("--no-db", action="store_true", help="Only check the journals' internal consistency")
+    args = parser.parse_args()
+
+    result = reconcile(args.client_file, args.bank_file, args.state_file, args.workers,
+                       args.reset, not args.no_db, args.chunk_size)
+    print(format_discrepancies(result))
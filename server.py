@@ -1,17 +1,26 @@
 import socket
 import threading
 import configparser
+import json
 import time
+from admin_control import AdminServer, DRAIN_TIMEOUT
 from db_handler import (
     initialize_database,
     register_user,
     authenticate_user,
     withdraw,
     deposit,
-    log_transaction
+    transfer,
+    execute_batch,
+    log_transaction,
+    CLIENT_TRANSACTION_FILE
 )
+from journal_archive import recover_archive
 from logger_utils import log_info, log_error
+from money import format_paise, parse_amount
 from server_monitor import get_monitor
+from session_timeouts import SessionGuard, SessionTimeout, get_session_registry
+from withdrawal_limits import get_limiter
 
 # ---------------- CONFIGURATION ----------------
 config = configparser.ConfigParser()
@@ -20,6 +29,108 @@ config.read("config.ini")
 HOST = config.get("server", "host", fallback="127.0.0.1")
 PORT = int(config.get("server", "port", fallback="65432"))
 WORKER_THREADS = int(config.get("server", "worker_threads", fallback="5"))
+MAX_BATCH_BYTES = int(config.get("server", "max_batch_bytes", fallback="65536"))
+
+# -----------------------------
+# Read Amount
+# -----------------------------
+def read_amount(conn, session, prompt):
+    """Prompt for an amount; return it in paise, or None if cancelled or invalid 5 times."""
+    conn.sendall(prompt)
+    amount_str = session.recv("amount").decode().strip()
+    
+    # Handle non-numeric input with 5 attempts
+    attempts = 0
+    while True:
+        if amount_str.lower() == 'exit':
+            conn.sendall(b"Transaction cancelled.\n")
+            return None
+        try:
+            return parse_amount(amount_str)
+        except ValueError:
+            attempts += 1
+            if attempts >= 5:
+                conn.sendall(b"Too many invalid inputs. Transaction cancelled.\n")
+                return None
+            conn.sendall(b"Invalid amount. Please enter a number with at most 2 decimals (or 'exit' to cancel): ")
+            amount_str = session.recv("amount").decode().strip()
+
+# -----------------------------
+# Batch Requests
+# -----------------------------
+# Batch result fields holding paise, sent as '500.00' strings
+MONEY_FIELDS = ("amount", "balance", "bank_balance", "recipient_balance")
+
+def _to_json(value):
+    """Convert batch results to JSON-friendly values (amounts as '500.00' strings)."""
+    if isinstance(value, dict):
+        return {
+            key: format_paise(item) if key in MONEY_FIELDS and isinstance(item, int) else _to_json(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [_to_json(item) for item in value]
+    return value
+
+
+def handle_batch(conn, session, mobile, request, session_start):
+    """
+    Execute a batch request and reply with all results in a single message.
+    
+    The request is one line: 'BATCH {"atomic": true, "stop_on_error": true,
+    "ops": [{"op": "withdraw", "amount": "500"}, {"op": "balance"}]}'.
+    See db_handler.execute_batch for the per-operation semantics.
+    """
+    # A batch is one newline-terminated line of JSON; read until it is complete.
+    # The menu deadline and minimum throughput apply to the whole upload
+    while b"\n" not in request and len(request) < MAX_BATCH_BYTES:
+        chunk = session.recv("menu", 4096, resume=True)
+        if not chunk:
+            break
+        request += chunk
+    
+    request, newline, rest = request.partition(b"\n")
+    oversized = len(request) >= MAX_BATCH_BYTES
+    # Skip the rest of an oversized line so it is not read as menu choices
+    while oversized and not newline:
+        chunk = session.recv("menu", 4096, resume=True)
+        if not chunk:
+            break
+        _, newline, rest = chunk.partition(b"\n")
+    # Anything after the newline is the client's next request
+    session.unread(rest)
+    
+    try:
+        if oversized:
+            raise ValueError(f"longer than {MAX_BATCH_BYTES} bytes")
+        # Keep JSON numbers as text so amounts are parsed exactly as rupees
+        body = json.loads(request.decode().strip()[len("BATCH"):], parse_float=str, parse_int=str)
+        if not isinstance(body, dict):
+            raise ValueError("expected a JSON object")
+        # Only JSON true/false; bool("false") would silently be True
+        for flag in ("atomic", "stop_on_error"):
+            if not isinstance(body.get(flag, True), bool):
+                raise ValueError(f'"{flag}" must be true or false')
+        result = execute_batch(
+            mobile,
+            body.get("ops"),
+            atomic=body.get("atomic", True),
+            stop_on_error=body.get("stop_on_error", True)
+        )
+    except ValueError as e:
+        result = {"status": "error", "message": f"Invalid batch request: {e}", "results": []}
+    
+    # Journal committed money movements exactly as the interactive menu does
+    for op in result["results"]:
+        if op["status"] != "ok" or not op["committed"]:
+            continue
+        if op["op"] in ("withdraw", "deposit"):
+            log_transaction(mobile, op["op"], op["amount"], op["balance"], session_start, op["bank_balance"])
+        elif op["op"] == "transfer":
+            log_transaction(mobile, "transfer_out", op["amount"], op["balance"], session_start)
+            log_transaction(op["recipient"], "transfer_in", op["amount"], op["recipient_balance"])
+    
+    conn.sendall(f"BATCH_RESULT {json.dumps(_to_json(result), ensure_ascii=False)}\n".encode())
 
 # -----------------------------
 # Handle Individual Client
@@ -32,10 +143,19 @@ def handle_client(conn, addr):
     # Track connection in server monitor
     monitor = get_monitor()
     monitor.increment_connection()
+    
+    # Enforce per-prompt timeouts and the session lifetime cap
+    try:
+        session = SessionGuard(conn, addr)
+    except SessionTimeout:
+        # Server is draining; refuse the connection
+        monitor.decrement_connection()
+        conn.close()
+        return
 
     try:
         conn.sendall(b"Welcome to ATM.\nEnter your mobile number to begin (or 'exit' to quit): ")
-        mobile = conn.recv(1024).decode().strip()
+        mobile = session.recv("mobile").decode().strip()
         
         if mobile.lower() == 'exit':
             conn.sendall(b"Thank you for visiting. Goodbye!\n")
@@ -46,6 +166,8 @@ def handle_client(conn, addr):
             conn.close()
             return
 
+        session.mobile = mobile
+
         # Auto-register user if not found
         reg_result = register_user(mobile)
         conn.sendall(f"{reg_result['message']}\n".encode())
@@ -61,7 +183,7 @@ def handle_client(conn, addr):
         attempts = 0
         while not authenticated and attempts < 5:
             conn.sendall(b"Enter your 5-digit PIN (or 'exit' to quit): ")
-            pin = conn.recv(1024).decode().strip()
+            pin = session.recv("pin").decode().strip()
             
             if pin.lower() == 'exit':
                 conn.sendall(b"Thank you for visiting. Goodbye!\n")
@@ -93,109 +215,100 @@ def handle_client(conn, addr):
                 "\nSelect an option:\n"
                 "1. Withdraw\n"
                 "2. Deposit\n"
-                "3. Exit\n"
-                "Enter choice (1, 2, or 3): "
+                "3. Transfer\n"
+                "4. Exit\n"
+                "Enter choice (1, 2, 3, or 4): "
             )
             conn.sendall(menu.encode())
-            choice = conn.recv(1024).decode().strip()
+            request = session.recv("menu")
+            
+            # Batched operations: "BATCH <json>" is answered with one "BATCH_RESULT <json>" line
+            if request.startswith(b"BATCH"):
+                handle_batch(conn, session, mobile, request, session_start)
+                continue
             
-            if choice.lower() == 'exit' or choice == '3':
+            choice = request.decode().strip()
+            
+            if choice.lower() == 'exit' or choice == '4':
                 conn.sendall(b"Thank you for using ATM. Goodbye!\n")
                 log_transaction(mobile, "exit", None, None, session_start)
                 log_info(f"Connection closed for {mobile} ({addr})")
                 break
 
             # Handle invalid menu choices with error handling
-            if choice not in ['1', '2', '3']:
-                conn.sendall(b"Invalid option. Please enter 1 for Withdraw, 2 for Deposit, or 3 to Exit.\n")
+            if choice not in ['1', '2', '3', '4']:
+                conn.sendall(b"Invalid option. Please enter 1 for Withdraw, 2 for Deposit, 3 for Transfer, or 4 to Exit.\n")
                 continue
 
             if choice == "1":
-                conn.sendall(b"Enter amount to withdraw (or 'exit' to cancel): ")
-                amount_str = conn.recv(1024).decode().strip()
-                
-                if amount_str.lower() == 'exit':
-                    conn.sendall(b"Transaction cancelled.\n")
-                    continue
-                    
-                # Handle non-numeric input with 5 attempts
-                attempts = 0
-                while attempts < 5:
-                    try:
-                        amount = float(amount_str)
-                        break
-                    except ValueError:
-                        attempts += 1
-                        if attempts >= 5:
-                            conn.sendall(b"Too many invalid inputs. Transaction cancelled.\n")
-                            break
-                        conn.sendall(b"Invalid amount. Please enter a number (or 'exit' to cancel): ")
-                        amount_str = conn.recv(1024).decode().strip()
-                        if amount_str.lower() == 'exit':
-                            conn.sendall(b"Transaction cancelled.\n")
-                            break
-                
-                if attempts >= 5 or amount_str.lower() == 'exit':
+                amount = read_amount(conn, session, b"Enter amount to withdraw (or 'exit' to cancel): ")
+                if amount is None:
                     continue
 
                 result = withdraw(mobile, amount)
+                
+                # Journal a committed transaction before replying, so a client
+                # that disconnects mid-reply cannot cost its journal row
+                if result["status"] == "ok":
+                    log_transaction(mobile, "withdraw", amount, result.get("balance"), session_start, result.get("bank_balance"))
                 conn.sendall(f"{result['message']}\n".encode())
                 
                 # Ensure the client receives the message before continuing
                 time.sleep(0.1)
+
+            elif choice == "2":
+                amount = read_amount(conn, session, b"Enter amount to deposit (or 'exit' to cancel): ")
+                if amount is None:
+                    continue
+
+                result = deposit(mobile, amount)
                 
-                # Log transaction if successful
+                # Journal a committed deposit before replying, as for withdrawals
                 if result["status"] == "ok":
-                    log_transaction(mobile, "withdraw", amount, result.get("balance"), session_start, result.get("bank_balance"))
+                    log_transaction(mobile, "deposit", amount, result.get("balance"), session_start, result.get("bank_balance"))
+                conn.sendall(f"{result['message']}\n".encode())
+                
+                # Ensure the client receives the message before continuing
+                time.sleep(0.1)
 
-            elif choice == "2":
-                conn.sendall(b"Enter amount to deposit (or 'exit' to cancel): ")
-                amount_str = conn.recv(1024).decode().strip()
+            elif choice == "3":
+                conn.sendall(b"Enter recipient mobile number (or 'exit' to cancel): ")
+                recipient = session.recv("recipient").decode().strip()
                 
-                if amount_str.lower() == 'exit':
+                if recipient.lower() == 'exit':
                     conn.sendall(b"Transaction cancelled.\n")
                     continue
-                
-                # Handle non-numeric input with 5 attempts
-                attempts = 0
-                while attempts < 5:
-                    try:
-                        amount = float(amount_str)
-                        break
-                    except ValueError:
-                        attempts += 1
-                        if attempts >= 5:
-                            conn.sendall(b"Too many invalid inputs. Transaction cancelled.\n")
-                            break
-                        conn.sendall(b"Invalid amount. Please enter a number (or 'exit' to cancel): ")
-                        amount_str = conn.recv(1024).decode().strip()
-                        if amount_str.lower() == 'exit':
-                            conn.sendall(b"Transaction cancelled.\n")
-                            break
-                
-                if attempts >= 5 or amount_str.lower() == 'exit':
+                    
+                if not recipient.isdigit() or len(recipient) < 5:
+                    conn.sendall(b"Invalid recipient mobile number. Transaction cancelled.\n")
                     continue
 
-                result = deposit(mobile, amount)
+                amount = read_amount(conn, session, b"Enter amount to transfer (or 'exit' to cancel): ")
+                if amount is None:
+                    continue
+
+                result = transfer(mobile, recipient, amount)
+                
+                # Journal both legs of a committed transfer before replying
+                if result["status"] == "ok":
+                    log_transaction(mobile, "transfer_out", amount, result.get("balance"), session_start)
+                    log_transaction(recipient, "transfer_in", amount, result.get("recipient_balance"))
                 conn.sendall(f"{result['message']}\n".encode())
                 
                 # Ensure the client receives the message before continuing
                 time.sleep(0.1)
-                
-                # Log transaction if successful
-                if result["status"] == "ok":
-                    log_transaction(mobile, "deposit", amount, result.get("balance"), session_start, result.get("bank_balance"))
-
-            elif choice == "3":
-                conn.sendall(b"Thank you for using ATM. Goodbye!\n")
-                log_transaction(mobile, "logout", None, None, session_start)
-                log_info(f"Connection closed for {mobile} ({addr})")
-                break
 
+    except SessionTimeout as e:
+        log_info(f"Session for {mobile or 'unknown'} ({addr}) closed: {e.reason}")
     except Exception as e:
-        log_error(f"Error with client {addr}: {e}")
-        conn.sendall(b" Server error. Connection closing.\n")
+        if session.reaped_reason:
+            # A reply failed because the session was reaped mid-request
+            log_info(f"Session for {mobile or 'unknown'} ({addr}) closed: {session.reaped_reason}")
+        else:
+            log_error(f"Error with client {addr}: {e}")
+            conn.sendall(b" Server error. Connection closing.\n")
     finally:
+        session.close()
         # Decrement connection count in server monitor
         monitor.decrement_connection()
         conn.close()
@@ -207,9 +320,18 @@ def handle_client(conn, addr):
 def start_server():
     initialize_database()
     
+    # Convert journal segments whose archiving was cut short by the last shutdown
+    recover_archive()
+    
+    # Rebuild per-account withdrawal limit counters from the journal; snapshot them in the background
+    limiter = get_limiter()
+    limiter.rebuild(CLIENT_TRANSACTION_FILE)
+    limiter.start_persisting()
+    
     # Initialize and start server monitoring
     monitor_interval = int(config.get("server", "monitor_interval", fallback="60"))
-    monitor = get_monitor(interval=monitor_interval)
+    history_file = config.get("server", "metrics_history_file", fallback="metrics_history.bin")
+    monitor = get_monitor(interval=monitor_interval, history_file=history_file)
     monitor.start()
     log_info(f"Server monitoring started with {monitor_interval}s interval")
 
@@ -217,21 +339,45 @@ def start_server():
         server_socket.bind((HOST, PORT))
         server_socket.listen(5)
         log_info(f"ATM Server running on {HOST}:{PORT}")
-
-        while True:
-            conn, addr = server_socket.accept()
+        
+        # Local control socket for listing/killing sessions and draining
+        admin = AdminServer()
+        admin.start()
+        
+        # Wake up periodically so a drain request stops the accept loop
+        server_socket.settimeout(1.0)
+        while not admin.draining.is_set():
+            try:
+                conn, addr = server_socket.accept()
+            except socket.timeout:
+                continue
+            conn.settimeout(None)
             client_thread = threading.Thread(target=handle_client, args=(conn, addr), daemon=True)
             client_thread.start()
 
+    # Draining: the listening socket is closed; let in-flight requests finish and journal
+    if not get_session_registry().wait_empty(DRAIN_TIMEOUT):
+        log_error(f"Drain timed out after {DRAIN_TIMEOUT:.0f}s with sessions still open")
+    admin.stop()
+    shutdown_server()
+    log_info("Server drained and stopped.")
+
+
+def shutdown_server():
+    """Flush state that must survive a restart."""
+    # Stop the server monitor
+    get_monitor().stop()
+    limiter = get_limiter()
+    limiter.stop_persisting()
+    limiter.persist()
+
 
 if __name__ == "__main__":
     try:
         start_server()
     except KeyboardInterrupt:
         log_info("Server stopped manually.")
-        # Stop the server monitor
-        get_monitor().stop()
+        shutdown_server()
     except Exception as e:
         log_error(f"Server crashed: {e}")
-        # Stop the server monitor
-        get_monitor().stop()
+        shutdown_server()
@@ -1,9 +1,201 @@
+import argparse
+import array
+import struct
+import sys
 import threading
 import psutil
 import time
 import os
 from logger_utils import get_logger
 
+# Sampled once per second into every tier
+METRICS = ("cpu", "rss_mb", "threads", "connections", "transactions")
+
+# (name, seconds per slot, slots): 1 hour of seconds, 1 day of minutes, 30 days of hours
+HISTORY_TIERS = (("second", 1, 3600), ("minute", 60, 1440), ("hour", 3600, 720))
+
+HISTORY_MAGIC = b"ATMH"
+HISTORY_VERSION = 1
+
+
+class HistoryTier:
+    """
+    Fixed-size ring of time slots holding the mean and peak of each metric.
+
+    Slots are addressed by time (slot = timestamp // step % slots), so
+    recording a sample is O(1), slots skipped while the sampler was not
+    running are cleared as the ring advances, and a loaded history lines up
+    with the clock without any timestamps being stored.
+    """
+
+    def __init__(self, name, step, slots):
+        self.name = name
+        self.step = step
+        self.head = None
+        self.counts = array.array("I", [0]) * slots
+        self.means = {metric: array.array("f", [0.0]) * slots for metric in METRICS}
+        self.peaks = {metric: array.array("f", [0.0]) * slots for metric in METRICS}
+
+    def _clear(self, slot):
+        self.counts[slot] = 0
+        for metric in METRICS:
+            self.means[metric][slot] = 0.0
+            self.peaks[metric][slot] = 0.0
+
+    def _advance(self, now):
+        """Clear slots that have rotated out since the last sample; return the current slot time."""
+        current = int(now // self.step)
+        if self.head is not None and current > self.head:
+            for index in range(self.head + 1, min(current, self.head + len(self.counts)) + 1):
+                self._clear(index % len(self.counts))
+        if self.head is None or current > self.head:
+            self.head = current
+        return current
+
+    def record(self, now, sample):
+        """Fold one sample (metric -> value) into the slot covering now."""
+        current = self._advance(now)
+        if current <= self.head - len(self.counts):
+            return
+        slot = current % len(self.counts)
+        count = self.counts[slot] + 1
+        self.counts[slot] = count
+        for metric in METRICS:
+            value = sample[metric]
+            mean = self.means[metric]
+            mean[slot] += (value - mean[slot]) / count
+            if count == 1 or value > self.peaks[metric][slot]:
+                self.peaks[metric][slot] = value
+
+    def rows(self, last=None):
+        """
+        Return (timestamp, {metric: (mean, peak)}) for filled slots, oldest first.
+
+        Args:
+            last (int): Only the most recent this many slots
+        """
+        if self.head is None:
+            return []
+        slots = len(self.counts)
+        span = slots if last is None else min(last, slots)
+        rows = []
+        for current in range(self.head - span + 1, self.head + 1):
+            slot = current % slots
+            if self.counts[slot]:
+                rows.append((current * self.step, {
+                    metric: (self.means[metric][slot], self.peaks[metric][slot]) for metric in METRICS
+                }))
+        return rows
+
+    def mean(self, metric, last):
+        """Sample-weighted mean of a metric over the most recent slots (0 if empty)."""
+        if self.head is None:
+            return 0.0
+        slots = len(self.counts)
+        total = weighted = 0
+        for current in range(self.head - min(last, slots) + 1, self.head + 1):
+            slot = current % slots
+            total += self.counts[slot]
+            weighted += self.counts[slot] * self.means[metric][slot]
+        return weighted / total if total else 0.0
+
+
+class MetricHistory:
+    """
+    Fixed-memory time series of server metrics at second, minute and hour resolution.
+
+    Every sample updates all tiers directly (each slot keeps a running mean
+    and peak), so minute and hour aggregates are exact without a separate
+    roll-up pass. Memory is constant: about 0.3MB for the default tiers.
+    """
+
+    def __init__(self, tiers=HISTORY_TIERS):
+        self.tiers = {name: HistoryTier(name, step, slots) for name, step, slots in tiers}
+        self.lock = threading.Lock()
+
+    def record(self, now, sample):
+        with self.lock:
+            for tier in self.tiers.values():
+                tier.record(now, sample)
+
+    def save(self, path):
+        """
+        Write the history to a compact binary file.
+
+        Layout (little-endian): magic, version, metric count, the metric
+        names; then per tier its name, step, slot count and head followed by
+        the raw slot arrays (counts, then means and peaks per metric).
+        """
+        temp_path = f"{path}.tmp"
+        with self.lock, open(temp_path, "wb") as history_file:
+            names = ",".join(METRICS).encode()
+            history_file.write(struct.pack("<4sHHH", HISTORY_MAGIC, HISTORY_VERSION, len(self.tiers), len(names)))
+            history_file.write(names)
+            for tier in self.tiers.values():
+                name = tier.name.encode()
+                head = -1 if tier.head is None else tier.head
+                history_file.write(struct.pack("<H", len(name)) + name)
+                history_file.write(struct.pack("<IIq", tier.step, len(tier.counts), head))
+                for values in [tier.counts] + [arrays[metric] for metric in METRICS for arrays in (tier.means, tier.peaks)]:
+                    _write_array(history_file, values)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read a history written by save().
+
+        Raises:
+            ValueError: If the file is not a history file or was written with
+                different metrics
+        """
+        with open(path, "rb") as history_file:
+            data = history_file.read()
+
+        magic, version, tier_count, names_length = struct.unpack_from("<4sHHH", data, 0)
+        if magic != HISTORY_MAGIC or version != HISTORY_VERSION:
+            raise ValueError(f"{path} is not a metrics history file")
+        offset = struct.calcsize("<4sHHH")
+        names = data[offset:offset + names_length].decode().split(",")
+        offset += names_length
+        if tuple(names) != METRICS:
+            raise ValueError(f"{path} records different metrics: {names}")
+
+        tiers = []
+        for _ in range(tier_count):
+            (name_length,) = struct.unpack_from("<H", data, offset)
+            name = data[offset + 2:offset + 2 + name_length].decode()
+            offset += 2 + name_length
+            step, slots, head = struct.unpack_from("<IIq", data, offset)
+            offset += struct.calcsize("<IIq")
+            tier = HistoryTier(name, step, slots)
+            tier.head = None if head < 0 else head
+            for values in [tier.counts] + [arrays[metric] for metric in METRICS for arrays in (tier.means, tier.peaks)]:
+                offset = _read_array(data, offset, values)
+            tiers.append(tier)
+
+        history = cls(tiers=())
+        history.tiers = {tier.name: tier for tier in tiers}
+        return history
+
+
+def _write_array(history_file, values):
+    """Write an array as little-endian fixed-width values."""
+    if sys.byteorder == "big":
+        values = array.array(values.typecode, values)
+        values.byteswap()
+    history_file.write(values.tobytes())
+
+
+def _read_array(data, offset, values):
+    """Fill an array in place from little-endian bytes; return the offset after it."""
+    end = offset + len(values) * values.itemsize
+    values[:] = array.array(values.typecode, data[offset:end])
+    if sys.byteorder == "big":
+        values.byteswap()
+    return end
+
+
 class ServerMonitor:
     """
     Monitors server utilization metrics including:
@@ -11,28 +203,52 @@ class ServerMonitor:
     - Memory usage
     - Active threads
     - Connection count
+    - Sessions reaped by timeouts
+    - Transaction rate
+    
+    Metrics are sampled every second into a MetricHistory and logged every
+    interval. The history is saved to history_file when the monitor stops.
     """
     
-    def __init__(self, interval=60):
+    def __init__(self, interval=60, history_file=None):
         """
         Initialize the server monitor
         
         Args:
-            interval (int): Monitoring interval in seconds (default: 60)
+            interval (int): Logging interval in seconds (default: 60)
+            history_file (str): Binary file the metric history is loaded from
+                and saved to (default: not persisted)
         """
         self.interval = interval
+        self.history_file = history_file
         self.active_connections = 0
         self.max_connections = 0
         self.total_connections = 0
+        self.transactions = 0
+        self.reaped_sessions = {}
+        self.lock = threading.Lock()
         self.monitor_thread = None
         self.running = False
+        self.wakeup = threading.Event()
         self.logger = get_logger("ServerMonitor")
         self.pid = os.getpid()
+        self.process = psutil.Process(self.pid)
         self.start_time = time.time()
+        self.history = self._load_history()
+        self.latest = None
+    
+    def _load_history(self):
+        """Continue the saved history if there is one, otherwise start empty"""
+        if self.history_file and os.path.isfile(self.history_file):
+            try:
+                return MetricHistory.load(self.history_file)
+            except (OSError, ValueError, struct.error) as e:
+                self.logger.error(f"Ignoring unreadable metrics history: {e}")
+        return MetricHistory()
         
     def increment_connection(self):
         """Increment the active connection counter"""
-        with threading.Lock():
+        with self.lock:
             self.active_connections += 1
             self.total_connections += 1
             if self.active_connections > self.max_connections:
@@ -40,23 +256,48 @@ class ServerMonitor:
     
     def decrement_connection(self):
         """Decrement the active connection counter"""
-        with threading.Lock():
+        with self.lock:
             self.active_connections -= 1
     
+    def record_reaped(self, reason):
+        """Count a session terminated by a timeout or throughput check"""
+        with self.lock:
+            self.reaped_sessions[reason] = self.reaped_sessions.get(reason, 0) + 1
+    
+    def record_transaction(self):
+        """Count a completed money-moving transaction"""
+        with self.lock:
+            self.transactions += 1
+    
     def get_thread_count(self):
         """Get the number of active threads in the process"""
         return threading.active_count()
     
     def get_cpu_usage(self):
-        """Get the CPU usage percentage for this process"""
-        return psutil.Process(self.pid).cpu_percent(interval=0.1)
+        """Get the CPU usage percentage for this process since the previous call (non-blocking)"""
+        return self.process.cpu_percent(interval=None)
     
     def get_memory_usage(self):
         """Get the memory usage in MB for this process"""
-        process = psutil.Process(self.pid)
-        memory_info = process.memory_info()
+        memory_info = self.process.memory_info()
         return memory_info.rss / (1024 * 1024)  # Convert to MB
     
+    def sample(self, now=None):
+        """Take one sample of every metric and record it in the history"""
+        now = time.time() if now is None else now
+        with self.lock:
+            transactions, self.transactions = self.transactions, 0
+            connections = self.active_connections
+        self.latest = {
+            "cpu": self.get_cpu_usage(),
+            "rss_mb": self.get_memory_usage(),
+            "threads": self.get_thread_count(),
+            "connections": connections,
+            "transactions": transactions,
+        }
+        self.history.record(now, self.latest)
+        return self.latest
+    
     def get_uptime(self):
         """Get the server uptime in seconds"""
         return time.time() - self.start_time
@@ -71,9 +312,13 @@ class ServerMonitor:
     def log_metrics(self):
         """Log the current server metrics"""
         uptime = self.get_uptime()
-        cpu_usage = self.get_cpu_usage()
-        memory_usage = self.get_memory_usage()
-        thread_count = self.get_thread_count()
+        latest = self.latest or self.sample()
+        seconds = self.history.tiers["second"]
+        cpu_usage = seconds.mean("cpu", self.interval)
+        memory_usage = latest["rss_mb"]
+        thread_count = latest["threads"]
+        transaction_rate = seconds.mean("transactions", self.interval)
+        reaped = ", ".join(f"{reason}={count}" for reason, count in sorted(self.reaped_sessions.items()))
         
         self.logger.info(
             f"SERVER METRICS | "
@@ -83,14 +328,34 @@ class ServerMonitor:
             f"Threads: {thread_count} | "
             f"Active Connections: {self.active_connections} | "
             f"Max Connections: {self.max_connections} | "
-            f"Total Connections: {self.total_connections}"
+            f"Total Connections: {self.total_connections} | "
+            f"Transactions: {transaction_rate:.2f}/s | "
+            f"Reaped Sessions: {sum(self.reaped_sessions.values())}"
+            + (f" ({reaped})" if reaped else "")
         )
     
     def monitor_loop(self):
-        """Main monitoring loop that runs in a separate thread"""
+        """Main monitoring loop: sample every second, log every interval"""
+        self.get_cpu_usage()  # Prime the non-blocking CPU counter
+        next_sample = time.time()
+        next_log = next_sample + self.interval
         while self.running:
-            self.log_metrics()
-            time.sleep(self.interval)
+            self.sample()
+            if time.time() >= next_log:
+                self.log_metrics()
+                next_log += self.interval
+            next_sample += 1
+            self.wakeup.wait(max(0.0, next_sample - time.time()))
+    
+    def save_history(self):
+        """Persist the metric history to history_file"""
+        if not self.history_file:
+            return
+        try:
+            self.history.save(self.history_file)
+            self.logger.info(f"Metrics history saved to {self.history_file}")
+        except OSError as e:
+            self.logger.error(f"Failed to save metrics history: {e}")
     
     def start(self):
         """Start the monitoring thread"""
@@ -104,19 +369,41 @@ class ServerMonitor:
             self.logger.info("Server monitoring started")
     
     def stop(self):
-        """Stop the monitoring thread"""
+        """Stop the monitoring thread and save the metric history"""
         if self.running:
             self.running = False
+            self.wakeup.set()
             if self.monitor_thread:
                 self.monitor_thread.join(timeout=1.0)
+            self.save_history()
             self.logger.info("Server monitoring stopped")
 
 # Singleton instance
 _monitor = None
 
-def get_monitor(interval=60):
+def get_monitor(interval=60, history_file=None):
     """Get the singleton monitor instance"""
     global _monitor
     if _monitor is None:
-        _monitor = ServerMonitor(interval)
-    return _monitor
\ No newline at end of file
+        _monitor = ServerMonitor(interval, history_file)
+    return _monitor
+
+
+def format_history(history, tier="minute", last=60):
+    """Render the most recent slots of one tier as a table of mean/peak values."""
+    tier = history.tiers[tier]
+    lines = ["TIME                 " + " ".join(f"{metric:>19}" for metric in METRICS)]
+    for timestamp, values in tier.rows(last):
+        cells = " ".join(f"{values[metric][0]:>9.1f}/{values[metric][1]:<9.1f}" for metric in METRICS)
+        lines.append(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))}  {cells}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show metrics saved by the server monitor (mean/peak per slot).")
+    parser.add_argument("history_file", nargs="?", default="metrics_history.bin")
+    parser.add_argument("--tier", choices=[name for name, _, _ in HISTORY_TIERS], default="minute")
+    parser.add_argument("--last", type=int, default=60, help="Number of most recent slots to show")
+    args = parser.parse_args()
+
+    print(format_history(MetricHistory.load(args.history_file), args.tier, args.last))
\ No newline at end of file
@@ -0,0 +1,342 @@
+import configparser
+import socket
+import threading
+import time
+
+from server_monitor import get_monitor
+
+# ---------------- CONFIGURATION ----------------
+config = configparser.ConfigParser()
+config.read("config.ini")
+
+# Seconds a client may take to answer each kind of prompt
+STATE_TIMEOUTS = {
+    "mobile": float(config.get("timeouts", "mobile", fallback="60")),
+    "pin": float(config.get("timeouts", "pin", fallback="60")),
+    "menu": float(config.get("timeouts", "menu", fallback="120")),
+    "amount": float(config.get("timeouts", "amount", fallback="60")),
+    "recipient": float(config.get("timeouts", "recipient", fallback="60")),
+}
+SESSION_LIFETIME = float(config.get("timeouts", "session_lifetime", fallback="900"))
+# Reasons that end a session even in the middle of a request. Shutting the
+# socket down fails a reply the client is not reading, which would otherwise
+# block the thread in sendall() indefinitely; replies are only sent after
+# the request's journal rows are written
+HARD_REAP_REASONS = ("session_lifetime", "admin_kill")
+MIN_BYTES_PER_SECOND = float(config.get("timeouts", "min_bytes_per_second", fallback="16"))
+THROUGHPUT_GRACE = float(config.get("timeouts", "throughput_grace", fallback="5"))
+TIMER_TICK = float(config.get("timeouts", "timer_tick", fallback="1.0"))
+
+
+class SessionTimeout(Exception):
+    """Raised in the client thread when its session has been reaped."""
+
+    def __init__(self, reason):
+        super().__init__(f"Session reaped: {reason}")
+        self.reason = reason
+
+
+# -----------------------------
+# Timer Wheel
+# -----------------------------
+class _Timer:
+    __slots__ = ("slot", "rounds", "callback")
+
+    def __init__(self, slot, rounds, callback):
+        self.slot = slot
+        self.rounds = rounds
+        self.callback = callback
+
+
+class TimerWheel:
+    """
+    Hashed timing wheel that fires every session deadline from one thread.
+
+    Scheduling and cancelling are O(1) regardless of how many sessions are
+    open; each tick only visits the timers hashed into the current slot.
+    Deadlines are accurate to one tick.
+    """
+
+    def __init__(self, tick=TIMER_TICK, slots=512):
+        """
+        Initialize the wheel
+
+        Args:
+            tick (float): Seconds per slot
+            slots (int): Number of slots; timers further out wrap around
+                and wait the extra rounds in their slot
+        """
+        self.tick = tick
+        self.slots = [set() for _ in range(slots)]
+        self.position = 0
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def schedule(self, delay, callback):
+        """Run callback (on the wheel thread) after delay seconds; return a handle for cancel()."""
+        ticks = max(1, int(-(-delay // self.tick)))
+        with self.lock:
+            slot = (self.position + ticks) % len(self.slots)
+            timer = _Timer(slot, (ticks - 1) // len(self.slots), callback)
+            self.slots[slot].add(timer)
+        self._ensure_running()
+        return timer
+
+    def cancel(self, timer):
+        """Cancel a pending timer; cancelling a fired or cancelled timer is a no-op."""
+        if timer is not None:
+            with self.lock:
+                self.slots[timer.slot].discard(timer)
+
+    def _ensure_running(self):
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._run, daemon=True, name="TimerWheel")
+                    self.thread.start()
+
+    def _run(self):
+        next_tick = time.monotonic() + self.tick
+        while True:
+            time.sleep(max(0.0, next_tick - time.monotonic()))
+            next_tick += self.tick
+
+            expired = []
+            with self.lock:
+                self.position = (self.position + 1) % len(self.slots)
+                bucket = self.slots[self.position]
+                for timer in list(bucket):
+                    if timer.rounds:
+                        timer.rounds -= 1
+                    else:
+                        bucket.discard(timer)
+                        expired.append(timer)
+
+            for timer in expired:
+                try:
+                    timer.callback()
+                except Exception:
+                    pass  # A failing callback must not stop the wheel
+
+
+# Singleton instance
+_wheel = None
+
+def get_timer_wheel():
+    """Get the singleton timer wheel"""
+    global _wheel
+    if _wheel is None:
+        _wheel = TimerWheel()
+    return _wheel
+
+
+# -----------------------------
+# Session Registry
+# -----------------------------
+class SessionRegistry:
+    """
+    Live sessions keyed by id, for admin introspection and draining.
+
+    Registering, removing and looking up a session are O(1) dictionary
+    operations under one short lock, so the registry adds no per-request
+    cost to the client threads.
+    """
+
+    def __init__(self):
+        self.sessions = {}
+        self.next_id = 1
+        self.draining = False
+        self.lock = threading.Lock()
+        self.empty = threading.Condition(self.lock)
+
+    def register(self, guard):
+        """Add a session and return its id; refused with SessionTimeout while draining."""
+        with self.lock:
+            if self.draining:
+                raise SessionTimeout("drain")
+            session_id = self.next_id
+            self.next_id += 1
+            self.sessions[session_id] = guard
+            return session_id
+
+    def unregister(self, session_id):
+        with self.lock:
+            self.sessions.pop(session_id, None)
+            if not self.sessions:
+                self.empty.notify_all()
+
+    def get(self, session_id):
+        with self.lock:
+            return self.sessions.get(session_id)
+
+    def snapshot(self):
+        """Return (id, guard) pairs for every live session."""
+        with self.lock:
+            return list(self.sessions.items())
+
+    def drain(self):
+        """
+        Stop admitting sessions and end the existing ones once they are idle.
+
+        Sessions waiting at a prompt are closed immediately; sessions in the
+        middle of a request finish it (including journaling) and are closed
+        when they next wait for input.
+
+        Returns:
+            int: Number of sessions still open
+        """
+        with self.lock:
+            self.draining = True
+            guards = list(self.sessions.values())
+        for guard in guards:
+            guard.reap("drain")
+        return len(guards)
+
+    def wait_empty(self, timeout=None):
+        """Block until every session has closed; return False on timeout."""
+        with self.lock:
+            return self.empty.wait_for(lambda: not self.sessions, timeout)
+
+
+# Singleton instance
+_registry = None
+
+def get_session_registry():
+    """Get the singleton session registry"""
+    global _registry
+    if _registry is None:
+        _registry = SessionRegistry()
+    return _registry
+
+
+# -----------------------------
+# Session Guard
+# -----------------------------
+class SessionGuard:
+    """
+    Applies per-state timeouts, a total lifetime cap and minimum-throughput
+    detection to one client connection.
+
+    Every read from the client goes through recv(). When a deadline passes
+    the session is reaped: the socket is shut down, which wakes the blocked
+    client thread, and recv() raises SessionTimeout. A session that is
+    processing a request when it is reaped finishes the request and recv()
+    raises before the next read; for HARD_REAP_REASONS the socket is shut
+    down at once, so a reply stuck on a client that never reads fails too.
+    """
+
+    def __init__(self, conn, addr, wheel=None, registry=None):
+        self.conn = conn
+        self.addr = addr
+        self.wheel = wheel or get_timer_wheel()
+        self.registry = registry or get_session_registry()
+        self.started = time.time()
+        self.mobile = None
+        self.state = "connected"
+        self.state_since = self.started
+        self.state_deadline = None
+        self.state_bytes = 0
+        self.waiting = False
+        self.stage_since = self.started
+        self.reaped_reason = None
+        self.reap_lock = threading.Lock()
+        self.unread_data = b""
+        self.session_id = self.registry.register(self)
+        self.lifetime_timer = self.wheel.schedule(SESSION_LIFETIME, lambda: self.reap("session_lifetime"))
+
+    def recv(self, state, bufsize=1024, resume=False):
+        """
+        Read client input while in the given state.
+
+        Args:
+            state (str): Prompt being answered; one of STATE_TIMEOUTS
+            bufsize (int): Maximum bytes to read
+            resume (bool): Continue the current state (e.g. the rest of a
+                multi-chunk batch) without restarting its deadline; the
+                read is also checked against the minimum throughput
+
+        Raises:
+            SessionTimeout: If the session was reaped while waiting
+        """
+        now = time.time()
+        if not resume or self.state_deadline is None:
+            self.state = state
+            self.state_since = now
+            self.state_deadline = now + STATE_TIMEOUTS[state]
+            self.state_bytes = 0
+
+        with self.reap_lock:
+            if self.reaped_reason:
+                raise SessionTimeout(self.reaped_reason)
+            if self.unread_data:
+                # Input the client pipelined after a batch line; already received
+                data, self.unread_data = self.unread_data[:bufsize], self.unread_data[bufsize:]
+                return data
+            self.waiting = True
+            self.stage_since = now
+
+        reason = f"{self.state}_timeout"
+        timer = self.wheel.schedule(self.state_deadline - now, lambda: self.reap(reason))
+        try:
+            data = self.conn.recv(bufsize)
+        except OSError:
+            if self.reaped_reason:
+                raise SessionTimeout(self.reaped_reason)
+            raise
+        finally:
+            self.wheel.cancel(timer)
+            with self.reap_lock:
+                self.waiting = False
+                self.stage_since = time.time()
+
+        if self.reaped_reason:
+            raise SessionTimeout(self.reaped_reason)
+
+        self.state_bytes += len(data)
+        if resume:
+            elapsed = time.time() - self.state_since
+            if elapsed > THROUGHPUT_GRACE and self.state_bytes / elapsed < MIN_BYTES_PER_SECOND:
+                self.reap("slow_client")
+                raise SessionTimeout(self.reaped_reason)
+        return data
+
+    def unread(self, data):
+        """Return data to the front of the input, to be read again by the next recv()."""
+        self.unread_data = data + self.unread_data
+
+    def reap(self, reason):
+        """
+        Terminate the session (safe to call from any thread, only the first call counts).
+
+        A session waiting for input is disconnected immediately; one that is
+        processing a request is disconnected at its next read, or at once
+        for HARD_REAP_REASONS.
+        """
+        with self.reap_lock:
+            if self.reaped_reason:
+                return
+            self.reaped_reason = reason
+            if self.waiting or reason in HARD_REAP_REASONS:
+                try:
+                    self.conn.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+        get_monitor().record_reaped(reason)
+
+    def describe(self, now=None):
+        """Summarize the session for the admin 'list' command."""
+        now = time.time() if now is None else now
+        return {
+            "id": self.session_id,
+            "addr": f"{self.addr[0]}:{self.addr[1]}" if isinstance(self.addr, tuple) else str(self.addr),
+            "mobile": self.mobile,
+            "state": self.state if self.waiting else "processing",
+            "age": round(now - self.started, 1),
+            "stage_latency": round(now - self.stage_since, 3),
+            "reaped": self.reaped_reason,
+        }
+
+    def close(self):
+        """Release the session's timers and remove it from the registry."""
+        self.wheel.cancel(self.lifetime_timer)
+        self.registry.unregister(self.session_id)
@@ -0,0 +1,28 @@
+import logging
+
+import pytest
+
+import logger_utils
+
+
+def get_test_logger(name="ATMLogger"):
+    """Stand-in for logger_utils.get_logger that never opens bank_server.log.
+
+    Records still propagate to the root logger, so pytest captures them.
+    """
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+    if not logger.handlers:
+        logger.addHandler(logging.NullHandler())
+    return logger
+
+
+# Patched before any test module imports code that calls get_logger
+logger_utils.get_logger = get_test_logger
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run the test from an empty directory, where the journals and archive are created."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
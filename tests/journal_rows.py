@@ -0,0 +1,33 @@
+"""Helpers that write and read back client journals in the tests."""
+import os
+import time
+
+from transaction_report import stream_new_rows
+
+HEADER = "Mobile_Number\tAction\tAmount\tUser_Balance\tBank_Balance\tTimestamp\tSession_Start\tElapsed_Time\n"
+
+
+def journal_row(index, action="withdraw", mobile=None):
+    """A client journal line; balances are not meant to be consistent."""
+    mobile = mobile or f"98000000{index % 7:02d}"
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(time.time() - 600 + index))
+    if action == "login":
+        return f"{mobile}\tlogin\t\t\t\t{timestamp}\t1760002255.59873\t{index}.25\n"
+    return (f"{mobile}\t{action}\t{100 + index}.00\t{900 - index}.50\t{998544 - index}.00\t"
+            f"{timestamp}\t{1760002255.5 + index % 3!r}\t{index / 4:.2f}\n")
+
+
+def append_rows(path, rows):
+    new = not os.path.exists(path)
+    with open(path, "a") as journal:
+        if new:
+            journal.write(HEADER)
+        journal.writelines(rows)
+
+
+def read_all(path, checkpoint=None, end=None):
+    """Return (rows, final checkpoint) streamed from a checkpoint."""
+    rows = []
+    for _, lines, checkpoint in stream_new_rows(path, checkpoint, end=end):
+        rows.extend("\t".join(line) + "\n" for line in lines)
+    return rows, checkpoint
@@ -0,0 +1,79 @@
+import os
+import socket
+import stat
+import time
+
+import pytest
+
+import admin_control
+from admin_control import AdminServer, send_command
+from session_timeouts import SessionGuard, SessionRegistry, SessionTimeout, TimerWheel
+
+
+@pytest.fixture
+def registry():
+    return SessionRegistry()
+
+
+@pytest.fixture
+def session(registry):
+    server_end, client_end = socket.socketpair()
+    guard = SessionGuard(server_end, ("127.0.0.1", 50000), wheel=TimerWheel(tick=0.01, slots=8), registry=registry)
+    guard.mobile = "9800000001"
+    yield guard
+    guard.close()
+    server_end.close()
+    client_end.close()
+
+
+def test_list_kill_and_drain(registry, session):
+    admin = AdminServer(path="unused.sock", registry=registry)
+
+    reply = admin.handle("list\n")
+    assert reply["status"] == "ok" and reply["draining"] is False
+    assert [(item["id"], item["mobile"], item["addr"]) for item in reply["sessions"]] == [
+        (session.session_id, "9800000001", "127.0.0.1:50000")
+    ]
+
+    assert admin.handle("kill 999") == {"status": "error", "message": "No session 999"}
+    assert admin.handle(f"kill {session.session_id}")["status"] == "ok"
+    with pytest.raises(SessionTimeout) as reaped:
+        session.recv("menu")
+    assert reaped.value.reason == "admin_kill"
+
+    assert admin.handle("drain") == {"status": "ok", "message": "Draining 1 sessions"}
+    assert admin.handle("list")["draining"] is True
+    with pytest.raises(SessionTimeout):
+        registry.register(object())
+
+
+@pytest.mark.parametrize("request_line", ["", "kill", "kill abc", "refill", "reboot now"])
+def test_malformed_commands_show_usage(registry, request_line):
+    reply = AdminServer(path="unused.sock", registry=registry).handle(request_line)
+    assert reply["status"] == "error"
+    assert reply["message"].startswith("Usage: ")
+
+
+def test_refill_entries_are_checked_before_the_database(registry):
+    admin = AdminServer(path="unused.sock", registry=registry)
+    assert admin.handle("refill 500=20 100=x") == {"status": "error", "message": "Invalid refill entry: 100=x"}
+    assert admin.handle("refill 500") == {"status": "error", "message": "Invalid refill entry: 500"}
+
+
+def test_control_socket_is_owner_only_and_times_out_stalled_clients(workdir, registry, monkeypatch):
+    monkeypatch.setattr(admin_control, "REQUEST_TIMEOUT", 0.2)
+    admin = AdminServer(path="admin.sock", registry=registry)
+    assert admin.start()
+    try:
+        assert stat.S_IMODE(os.stat("admin.sock").st_mode) == 0o600
+
+        # A client that connects and never sends its command is dropped, not waited on
+        stalled = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stalled.connect("admin.sock")
+        started = time.monotonic()
+        assert send_command("list", "admin.sock")["sessions"] == []
+        assert time.monotonic() - started < 2
+        stalled.close()
+    finally:
+        admin.stop()
+    assert not os.path.exists("admin.sock")
@@ -0,0 +1,28 @@
+from cash_dispenser import cash_total, dispense_error, format_plan, inventory_key, plan_dispense
+
+
+def test_plan_prefers_large_notes():
+    inventory = inventory_key({500: 10, 200: 10, 100: 10})
+    assert plan_dispense(inventory, 1800) == ((500, 3), (200, 1), (100, 1))
+    assert format_plan(plan_dispense(inventory, 1800)) == "3 x ₹500, 1 x ₹200, 1 x ₹100"
+
+
+def test_plan_backs_off_a_preferred_note_when_needed():
+    # Two ₹500 notes would leave ₹600 with only ₹200 notes short of it
+    inventory = inventory_key({500: 5, 200: 2, 100: 0})
+    assert plan_dispense(inventory, 1400) == ((500, 2), (200, 2))
+    assert plan_dispense(inventory, 1600) is None
+    assert plan_dispense(inventory_key({500: 1, 200: 3}), 600) == ((200, 3),)
+
+
+def test_plan_rejects_amounts_the_cassettes_cannot_supply():
+    inventory = inventory_key({500: 1, 200: 0, 100: 2})
+    assert plan_dispense(inventory, 0) is None
+    assert plan_dispense(inventory, 750) is None
+    assert cash_total(inventory) == 700
+    assert dispense_error(inventory, 700) is None
+    assert dispense_error(inventory, 800) == "ATM out of cash. Please try a smaller amount."
+    assert dispense_error(inventory, 400) == (
+        "ATM cannot dispense ₹400 with the notes available (₹100, ₹500). Please try a different amount."
+    )
+    assert dispense_error(inventory_key({}), 100) == "ATM out of cash. Please try a smaller amount."
@@ -0,0 +1,57 @@
+from db_handler import deposit, execute_batch, refill_cassettes, transfer, withdraw
+
+
+def test_public_operations_take_int_paise_only():
+    # Rupee text and floats are parsed at the edge (money.parse_amount), never guessed at here
+    for amount in ("500", 500.0, True, None):
+        assert withdraw("9800000001", amount)["message"] == "Invalid amount format."
+        assert deposit("9800000001", amount)["message"] == "Invalid amount format."
+        assert transfer("9800000001", "9800000002", amount)["message"] == "Invalid amount format."
+
+    assert withdraw("9800000001", 5)["message"] == "Minimum withdrawal amount is ₹100."
+
+
+def test_batch_amounts_are_rupee_text():
+    result = execute_batch("9800000001", [
+        {"op": "withdraw", "amount": "50"},
+        {"op": "withdraw", "amount": "150.50"},
+        {"op": "deposit", "amount": "12.345"},
+    ], atomic=False, stop_on_error=False)
+
+    assert [item["message"] for item in result["results"]] == [
+        "Minimum withdrawal amount is ₹100.",
+        "ATM can only dispense whole rupee amounts.",
+        "Invalid amount format.",
+    ]
+
+
+def test_refill_counts_must_be_positive_whole_numbers():
+    for notes in ({}, {500: 0}, {500: -3}, {500: "10"}, {500: 2.0}, {500: True}, {500: 10, 200: 0}):
+        assert refill_cassettes(notes) == {
+            "status": "error", "message": "Refill counts must be positive whole numbers of notes."
+        }
+
+
+def test_atomic_batch_with_an_invalid_operation_runs_nothing():
+    result = execute_batch("9800000001", [{"op": "balance"}, {"op": "dance"}, {"op": "balance"}])
+    assert result["status"] == "error"
+    assert [(item["status"], item["committed"]) for item in result["results"]] == [
+        ("skipped", False), ("error", False), ("skipped", False)
+    ]
+    assert result["results"][1]["message"] == "Unknown operation: dance."
+
+
+def test_non_atomic_batch_stop_on_error():
+    operations = [{"op": "withdraw", "amount": "x"}, {"op": "deposit", "amount": "-5"}]
+    stopped = execute_batch("9800000001", operations, atomic=False, stop_on_error=True)
+    assert [item["status"] for item in stopped["results"]] == ["error", "skipped"]
+    assert stopped["stop_on_error"] is True
+
+    continued = execute_batch("9800000001", operations, atomic=False, stop_on_error=False)
+    assert [item["status"] for item in continued["results"]] == ["error", "error"]
+
+
+def test_batch_size_is_bounded():
+    for operations in ([], [{"op": "balance"}] * 21, {"op": "balance"}):
+        result = execute_batch("9800000001", operations)
+        assert (result["status"], result["results"]) == ("error", [])
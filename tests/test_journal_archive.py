@@ -0,0 +1,141 @@
+import json
+import os
+import time
+
+import journal_archive
+from journal_archive import Segment, archive_segment, recover_archive, rotate_journal, segment_paths, write_segment
+from journal_rows import HEADER, append_rows, journal_row, read_all
+from withdrawal_limits import WithdrawalLimiter
+
+# -----------------------------
+# Columnar Segments
+# -----------------------------
+def test_segment_round_trip(workdir):
+    rows = [journal_row(index, "login" if index % 5 == 0 else "withdraw") for index in range(40)]
+    append_rows("client.csv", rows)
+    write_segment("client.csv", "client.atmj")
+
+    with Segment("client.atmj") as segment:
+        assert segment.header == HEADER.rstrip("\n").split("\t")
+        decoded = ["\t".join(line) + "\n" for lines, _ in segment.text_rows(chunk_rows=7) for line in lines]
+        assert decoded == rows
+
+        # Byte offsets in the original CSV resolve back to rows
+        offset = len(HEADER) + sum(len(row) for row in rows[:10])
+        assert segment.row_at_offset(offset) == 10
+
+        matches = list(segment.query(mobile="9800000003"))
+        assert [match["Mobile_Number"] for match in matches] == ["9800000003"] * len(matches)
+        assert len(matches) == sum(row.startswith("9800000003") for row in rows)
+
+
+def test_session_start_is_stored_once_per_value(workdir):
+    append_rows("client.csv", [journal_row(index) for index in range(30)])
+    write_segment("client.csv", "client.atmj")
+
+    with Segment("client.atmj") as segment:
+        meta = segment.footer["columns"]["Session_Start"]
+        assert meta["encoding"] == "float_dictionary"
+        assert meta["dictionary"]["length"] == 3
+
+
+def test_segment_normalises_legacy_amounts(workdir):
+    rows = [journal_row(index) for index in range(3)]
+    legacy = rows[1].split("\t")
+    legacy[2], legacy[3] = "100.555", "899.5"
+    rows[1] = "\t".join(legacy)
+    append_rows("client.csv", rows)
+    write_segment("client.csv", "client.atmj")
+
+    with Segment("client.atmj") as segment:
+        decoded = [line for lines, _ in segment.text_rows() for line in lines]
+        assert decoded[1][2:4] == ["100.56", "899.50"]
+        assert segment.row_at_offset(len(HEADER) + len(rows[0]) + len(rows[1])) == 2
+
+
+def test_segment_keeps_unreadable_amounts_as_text(workdir):
+    rows = [journal_row(index) for index in range(3)]
+    broken = rows[2].split("\t")
+    broken[4] = "n/a"
+    rows[2] = "\t".join(broken)
+    append_rows("client.csv", rows)
+    write_segment("client.csv", "client.atmj")
+
+    with Segment("client.atmj") as segment:
+        assert segment.footer["columns"]["Bank_Balance"]["encoding"] == "dictionary"
+        assert ["\t".join(line) + "\n" for lines, _ in segment.text_rows() for line in lines] == rows
+
+
+def test_recover_archive_finishes_interrupted_conversions(workdir):
+    rows = [journal_row(index) for index in range(6)]
+    append_rows("client.csv", rows)
+    rotated = rotate_journal("client.csv", max_bytes=1)
+    # As left by a server that exited while the archiver was writing
+    with open(os.path.splitext(rotated)[0] + ".atmj.tmp", "wb") as partial:
+        partial.write(b"ATMJ")
+
+    assert recover_archive() == [os.path.splitext(rotated)[0] + ".atmj"]
+    assert sorted(os.listdir("journal_archive")) == [os.path.basename(os.path.splitext(rotated)[0]) + ".atmj"]
+    assert read_all("client.csv")[0] == rows
+
+
+# -----------------------------
+# Checkpoints Across Rotations
+# -----------------------------
+def test_checkpoint_resumes_across_one_rotation(workdir):
+    rows = [journal_row(index) for index in range(9)]
+    append_rows("client.csv", rows[:3])
+    seen, checkpoint = read_all("client.csv")
+    assert seen == rows[:3]
+
+    append_rows("client.csv", rows[3:5])
+    archive_segment(rotate_journal("client.csv", max_bytes=1))
+    append_rows("client.csv", rows[5:])
+
+    seen, checkpoint = read_all("client.csv", checkpoint)
+    assert seen == rows[3:]
+    assert read_all("client.csv", checkpoint)[0] == []
+
+
+def test_checkpoint_resumes_across_several_rotations(workdir):
+    rows = [journal_row(index) for index in range(20)]
+    append_rows("client.csv", rows[:3])
+    _, checkpoint = read_all("client.csv")
+
+    append_rows("client.csv", rows[3:6])
+    archive_segment(rotate_journal("client.csv", max_bytes=1))
+    append_rows("client.csv", rows[6:10])
+    rotate_journal("client.csv", max_bytes=1)  # Left as CSV, as if the archiver had not run yet
+    append_rows("client.csv", rows[10:15])
+    archive_segment(rotate_journal("client.csv", max_bytes=1))
+    append_rows("client.csv", rows[15:])
+    assert [os.path.splitext(path)[1] for path in segment_paths("client.csv")] == [".atmj", ".csv", ".atmj"]
+
+    seen, final = read_all("client.csv", checkpoint)
+    assert seen == rows[3:]
+    assert read_all("client.csv", final)[0] == []
+
+    # A checkpoint taken inside an archived segment resumes from there
+    middle = {"identity": journal_archive.segment_identity(segment_paths("client.csv")[1]),
+              "offset": len(HEADER) + len(rows[6]) + len(rows[7])}
+    assert read_all("client.csv", middle)[0] == rows[8:]
+
+
+def test_limits_snapshot_without_checkpoint_is_not_double_counted(workdir):
+    append_rows("client.csv", [journal_row(index, mobile="9800000001") for index in range(3)])
+    expected = sum(100 + index for index in range(3)) * 100
+
+    limiter = WithdrawalLimiter(state_file="limits.json")
+    limiter.rebuild("client.csv")
+    assert limiter.accounts["9800000001"][1].totals(time.time()) == (expected, 3)
+
+    # A snapshot written while the journal was missing (mid-rotation) covers no known rows
+    with open("limits.json") as state_file:
+        snapshot = json.load(state_file)
+    snapshot["identity"] = None
+    with open("limits.json", "w") as state_file:
+        json.dump(snapshot, state_file)
+
+    limiter = WithdrawalLimiter(state_file="limits.json")
+    limiter.rebuild("client.csv")
+    assert limiter.accounts["9800000001"][1].totals(time.time()) == (expected, 3)
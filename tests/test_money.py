@@ -0,0 +1,51 @@
+import decimal
+
+import pytest
+
+from money import MAX_ACCOUNT_PAISE, format_paise, paise_from_db, parse_amount, parse_journal_paise, parse_paise
+
+
+def test_parse_paise_accepts_up_to_two_decimals():
+    assert parse_paise("500") == 50000
+    assert parse_paise("99.5") == 9950
+    assert parse_paise("99.05") == 9905
+    assert parse_paise(" 7.10 ") == 710
+    assert parse_paise("-3.25", allow_negative=True) == -325
+
+
+@pytest.mark.parametrize("text", ["", ".5", "5.", "1.234", "1e3", "-5", "+5", "nan", "inf", "1 000", "٥٠٠", "0x10"])
+def test_parse_paise_rejects_anything_else(text):
+    with pytest.raises(ValueError):
+        parse_paise(text)
+
+
+def test_parse_amount_is_capped_at_an_account_balance():
+    assert parse_amount("99999999.99") == MAX_ACCOUNT_PAISE
+    with pytest.raises(ValueError):
+        parse_amount("100000000")
+
+
+def test_format_paise_round_trips():
+    assert format_paise(0) == "0.00"
+    assert format_paise(5) == "0.05"
+    assert format_paise(105000) == "1050.00"
+    assert format_paise(-1) == "-0.01"
+    for paise in (0, 1, 99, 100, 12345, -12345, MAX_ACCOUNT_PAISE):
+        assert parse_paise(format_paise(paise), allow_negative=True) == paise
+
+
+def test_paise_from_db():
+    assert paise_from_db(decimal.Decimal("998544.50")) == 99854450
+    assert paise_from_db(12) == 1200
+    assert paise_from_db("-0.25") == -25
+
+
+def test_journal_amounts_are_read_leniently():
+    assert parse_journal_paise("100.0") == 10000
+    assert parse_journal_paise("100.555") == 10056  # Rounded as MySQL rounds into DECIMAL(10, 2)
+    assert parse_journal_paise("100.554") == 10055
+    assert parse_journal_paise("-0.005") == -1
+    assert parse_journal_paise("1e3") == 100000
+    for text in ("", "abc", "nan", "inf", "1e20", "1e999999"):
+        with pytest.raises(ValueError):
+            parse_journal_paise(text)
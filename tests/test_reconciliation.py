@@ -0,0 +1,78 @@
+from journal_archive import archive_segment, rotate_journal, stat_journal
+from journal_rows import append_rows, journal_row, read_all
+from reconciliation import empty_state, replay_chains, replay_client_journal
+
+
+# -----------------------------
+# Reconciliation Replay
+# -----------------------------
+def test_replay_tolerates_rows_journaled_out_of_order():
+    # Two commits on one account journaled in the opposite order
+    rows = [
+        (1, "9800000001", "withdraw", 10000, 80000, "t1"),
+        (2, "9800000001", "withdraw", 10000, 90000, "t0"),
+    ]
+    accounts = {}
+    assert replay_chains(accounts, rows, "account") == []
+    assert accounts["9800000001"][:2] == [80000, 2]
+
+
+def test_replay_reports_bad_first_row_after_window():
+    accounts = {}
+    rows = [(1, "9800000001", "withdraw", 10000, 50000, "t0")]
+    rows += [(sequence, "9800000002", "deposit", 100, 100000 + 100 * (sequence - 1), "t")
+             for sequence in range(2, 6)]
+    discrepancies = replay_chains(accounts, rows, "account", window=3)
+
+    assert [(item["mobile"], item["expected"], item["journaled"]) for item in discrepancies] == [
+        ("9800000001", 90000, 50000)
+    ]
+    assert accounts["9800000001"] == [50000, 1, []]
+
+
+# -----------------------------
+# Fixed End for Parallel Workers
+# -----------------------------
+def test_rows_written_after_the_end_are_left_unread(workdir):
+    rows = [journal_row(index) for index in range(8)]
+    append_rows("client.csv", rows[:3])
+    identity, size = stat_journal("client.csv")
+
+    # A partial line cut by the end stays unread, as would the rest of it
+    with open("client.csv", "a") as journal:
+        journal.write(rows[3][:10])
+    partial = {"identity": identity, "offset": size + 10}
+    append_rows("client.csv", [rows[3][10:]] + rows[4:])
+
+    seen, checkpoint = read_all("client.csv", end=partial)
+    assert seen == rows[:3]
+    assert checkpoint == {"identity": identity, "offset": size}
+    assert read_all("client.csv", checkpoint)[0] == rows[3:]
+
+
+def test_end_inside_a_rotated_journal(workdir):
+    rows = [journal_row(index) for index in range(12)]
+    append_rows("client.csv", rows[:4])
+    end = dict(zip(("identity", "offset"), stat_journal("client.csv")))
+
+    # Rotated and converted by the archiver before the worker got to it
+    append_rows("client.csv", rows[4:6])
+    archive_segment(rotate_journal("client.csv", max_bytes=1))
+    append_rows("client.csv", rows[6:])
+    assert read_all("client.csv", end=end)[0] == rows[:4]
+
+    _, checkpoint = read_all("client.csv", end={"identity": end["identity"], "offset": end["offset"] - 1})
+    assert read_all("client.csv", checkpoint, end=end)[0] == rows[3:4]
+
+
+def test_parallel_replay_matches_serial(workdir):
+    append_rows("client.csv", [journal_row(index, mobile=f"98000000{index % 5:02d}") for index in range(40)])
+
+    serial, parallel = empty_state(), empty_state()
+    replay_client_journal(serial, "client.csv")
+    replay_client_journal(parallel, "client.csv", workers=3)
+
+    assert parallel["accounts"] == serial["accounts"]
+    assert parallel["journals"] == serial["journals"]
+    assert parallel["sequences"] == serial["sequences"] == {"client.csv": 40}
+    assert parallel["discrepancy_count"] == serial["discrepancy_count"]
@@ -0,0 +1,63 @@
+import json
+import socket
+
+import pytest
+
+import server
+from session_timeouts import SessionGuard, SessionRegistry, TimerWheel
+
+
+@pytest.fixture
+def session():
+    """A guarded server-side socket, with the client end as session.client."""
+    server_end, client_end = socket.socketpair()
+    guard = SessionGuard(server_end, "test", wheel=TimerWheel(tick=0.01, slots=8), registry=SessionRegistry())
+    guard.client = client_end
+    yield guard
+    guard.close()
+    server_end.close()
+    client_end.close()
+
+
+def batch_reply(session):
+    reply = b""
+    while not reply.endswith(b"\n"):
+        reply += session.client.recv(65536)
+    prefix, _, body = reply.decode().partition(" ")
+    assert prefix == "BATCH_RESULT"
+    return json.loads(body)
+
+
+# -----------------------------
+# Batch Requests
+# -----------------------------
+@pytest.mark.parametrize("flags", ['"atomic": "false"', '"atomic": 0', '"stop_on_error": null', '"stop_on_error": "no"'])
+def test_batch_flags_must_be_json_booleans(session, flags):
+    request = f'BATCH {{{flags}, "ops": [{{"op": "balance"}}]}}\n'.encode()
+    server.handle_batch(session.conn, session, "9800000001", request, 0)
+
+    reply = batch_reply(session)
+    assert reply["status"] == "error"
+    assert reply["message"].startswith("Invalid batch request: ")
+    assert "must be true or false" in reply["message"]
+
+
+def test_batch_is_framed_at_the_first_newline(session):
+    # The line arrives in pieces, followed by the next menu choice
+    session.client.sendall(b'"op": "withdraw", "amount": "50"}]}\n4\n')
+    request = b'BATCH {"atomic": false, "stop_on_error": false, "ops": [{'
+    server.handle_batch(session.conn, session, "9800000001", request, 0)
+
+    reply = batch_reply(session)
+    assert reply["results"][0]["message"] == "Minimum withdrawal amount is ₹100."
+    assert session.recv("menu") == b"4\n"
+
+
+def test_oversized_batch_is_discarded_up_to_its_newline(session, monkeypatch):
+    monkeypatch.setattr(server, "MAX_BATCH_BYTES", 64)
+    session.client.sendall(b"x" * 200 + b"\n3\n")
+    server.handle_batch(session.conn, session, "9800000001", b"BATCH {", 0)
+
+    reply = batch_reply(session)
+    assert reply["message"] == "Invalid batch request: longer than 64 bytes"
+    assert session.recv("menu") == b"3\n"
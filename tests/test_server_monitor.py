@@ -0,0 +1,64 @@
+import struct
+
+import pytest
+
+from server_monitor import HISTORY_MAGIC, HISTORY_VERSION, METRICS, MetricHistory, format_history
+
+TIERS = (("second", 1, 10), ("minute", 60, 5))
+
+
+def sample(value):
+    return {metric: value for metric in METRICS}
+
+
+def test_slots_keep_mean_and_peak():
+    history = MetricHistory(TIERS)
+    for second, value in ((6000, 1.0), (6000.5, 3.0), (6001, 8.0)):
+        history.record(second, sample(value))
+
+    seconds = history.tiers["second"].rows()
+    assert [(timestamp, values["cpu"]) for timestamp, values in seconds] == [(6000, (2.0, 3.0)), (6001, (8.0, 8.0))]
+    assert history.tiers["minute"].rows() == [(6000, {metric: (4.0, 8.0) for metric in METRICS})]
+    assert history.tiers["second"].mean("cpu", last=2) == pytest.approx(4.0)
+
+
+def test_ring_clears_slots_skipped_while_not_sampling():
+    history = MetricHistory(TIERS)
+    history.record(1000, sample(5.0))
+    history.record(1003, sample(7.0))
+    history.record(1012, sample(9.0))  # A full turn of the 10-slot ring later
+
+    assert [timestamp for timestamp, _ in history.tiers["second"].rows()] == [1003, 1012]
+    history.record(1025, sample(1.0))
+    assert [timestamp for timestamp, _ in history.tiers["second"].rows()] == [1025]
+
+
+def test_save_and_load_round_trip(workdir):
+    history = MetricHistory(TIERS)
+    for second in range(120):
+        history.record(7200 + second, sample(second % 7 + 0.5))
+    history.save("history.bin")
+
+    loaded = MetricHistory.load("history.bin")
+    assert list(loaded.tiers) == ["second", "minute"]
+    for name, tier in history.tiers.items():
+        assert loaded.tiers[name].head == tier.head
+        assert loaded.tiers[name].rows() == tier.rows()
+    assert format_history(loaded, "second", last=3) == format_history(history, "second", last=3)
+
+    # An empty history keeps its tiers unstarted
+    MetricHistory(TIERS).save("empty.bin")
+    assert MetricHistory.load("empty.bin").tiers["minute"].rows() == []
+
+
+def test_load_rejects_other_files(workdir):
+    with open("other.bin", "wb") as other:
+        other.write(b"\0" * 64)
+    with pytest.raises(ValueError, match="not a metrics history file"):
+        MetricHistory.load("other.bin")
+
+    names = b"cpu,rss_mb"
+    with open("old.bin", "wb") as old:
+        old.write(struct.pack("<4sHHH", HISTORY_MAGIC, HISTORY_VERSION, 0, len(names)) + names)
+    with pytest.raises(ValueError, match="records different metrics"):
+        MetricHistory.load("old.bin")
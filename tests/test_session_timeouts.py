@@ -0,0 +1,121 @@
+import socket
+import threading
+import time
+
+import pytest
+
+import session_timeouts
+from session_timeouts import SessionGuard, SessionRegistry, SessionTimeout, TimerWheel
+
+
+# -----------------------------
+# Timer Wheel
+# -----------------------------
+def test_timer_wheel_fires_after_several_rounds():
+    wheel = TimerWheel(tick=0.01, slots=4)
+    fired = {}
+    done = threading.Event()
+    started = time.monotonic()
+
+    def record(name):
+        fired[name] = time.monotonic() - started
+        if len(fired) == 3:
+            done.set()
+
+    # 0.10s is 10 ticks on a 4-slot wheel: the timer waits two extra rounds in its slot
+    wheel.schedule(0.10, lambda: record("late"))
+    wheel.schedule(0.02, lambda: record("early"))
+    wheel.schedule(0.06, lambda: record("middle"))
+
+    assert done.wait(2)
+    assert sorted(fired, key=fired.get) == ["early", "middle", "late"]
+    assert fired["late"] >= 0.09
+
+
+def test_timer_wheel_cancel():
+    wheel = TimerWheel(tick=0.01, slots=4)
+    fired = []
+    done = threading.Event()
+
+    cancelled = wheel.schedule(0.05, lambda: fired.append("cancelled"))
+    wheel.schedule(0.09, done.set)
+    wheel.cancel(cancelled)
+    wheel.cancel(cancelled)  # Cancelling twice is a no-op
+
+    assert done.wait(2)
+    assert fired == []
+
+
+# -----------------------------
+# Session Guard
+# -----------------------------
+@pytest.fixture
+def pair():
+    server_end, client_end = socket.socketpair()
+    yield server_end, client_end
+    server_end.close()
+    client_end.close()
+
+
+def guard_for(conn):
+    return SessionGuard(conn, "test", wheel=TimerWheel(tick=0.01, slots=8), registry=SessionRegistry())
+
+
+def test_prompt_timeout_reaps_a_waiting_session(pair, monkeypatch):
+    monkeypatch.setitem(session_timeouts.STATE_TIMEOUTS, "pin", 0.05)
+    guard = guard_for(pair[0])
+
+    started = time.monotonic()
+    with pytest.raises(SessionTimeout) as reaped:
+        guard.recv("pin")
+    assert reaped.value.reason == "pin_timeout"
+    assert time.monotonic() - started < 2
+    guard.close()
+
+
+def blocked_reply(conn):
+    """Send to a client that never reads on a thread; return (thread, outcome list)."""
+    outcome = []
+
+    def reply():
+        try:
+            conn.sendall(b"x" * (16 * 1024 * 1024))
+            outcome.append("sent")
+        except OSError:
+            outcome.append("failed")
+
+    thread = threading.Thread(target=reply, daemon=True)
+    thread.start()
+    time.sleep(0.1)
+    return thread, outcome
+
+
+@pytest.mark.parametrize("reason", ["admin_kill", "session_lifetime"])
+def test_hard_reap_fails_a_reply_the_client_never_reads(pair, reason):
+    guard = guard_for(pair[0])
+    thread, outcome = blocked_reply(pair[0])
+    assert thread.is_alive()  # Stuck in sendall, the session is processing
+
+    guard.reap(reason)
+    thread.join(2)
+    assert outcome == ["failed"]
+    guard.close()
+
+
+def test_drain_lets_a_processing_session_finish(pair):
+    guard = guard_for(pair[0])
+    thread, outcome = blocked_reply(pair[0])
+
+    guard.reap("drain")
+    time.sleep(0.1)
+    assert thread.is_alive() and outcome == []
+
+    # The reply goes out once the client reads, then the next read ends the session
+    received = 0
+    while received < 16 * 1024 * 1024:
+        received += len(pair[1].recv(1024 * 1024))
+    thread.join(2)
+    assert outcome == ["sent"]
+    with pytest.raises(SessionTimeout):
+        guard.recv("menu")
+    guard.close()
@@ -0,0 +1,99 @@
+import pytest
+
+from transaction_report import (aggregate_bank_chunk, aggregate_client_chunk, empty_state, expire_accounts,
+                                process_journal, update_report)
+
+CLIENT_HEADER = "Mobile_Number\tAction\tAmount\tUser_Balance\tBank_Balance\tTimestamp\tSession_Start\tElapsed_Time\n"
+BANK_HEADER = "Mobile_Number\tAction\tAmount\tBank_Balance\tTimestamp\n"
+
+CLIENT_ROWS = [
+    "9800000001\tlogin\t\t\t\t2025-10-09 09:00:00\t1760000000.5\t1.00\n",
+    "9800000001\twithdraw\t100.0\t900.00\t998900.0\t2025-10-09 09:00:30\t1760000000.5\t31.00\n",
+    "9800000002\twithdraw\t500.00\t500.00\t998400.0\t2025-10-09 09:45:00\t1760000100.5\t12.00\n",
+    "9800000001\twithdraw\t200.50\t699.50\t998199.5\t2025-10-09 17:10:00\t1760000000.5\t40.00\n",
+    "9800000001\texit\t\t\t\t2025-10-09 17:10:05\t1760000000.5\t45.00\n",
+    "9800000002\tdeposit\t300.00\t800.00\t998499.5\t2025-10-10 08:00:00\t1760100000.5\t5.00\n",
+    "9800000002\twithdraw\t100.00\t700.00\t998399.5\t2025-10-10 08:00:10\t1760100000.5\t15.00\n",
+    "9800000002\tlogout\t\t\t\t2025-10-10 08:00:20\t1760100000.5\t25.00\n",
+]
+
+BANK_ROWS = [
+    "9800000001\twithdraw\t100.0\t998900.0\t2025-10-09 09:00:30\n",
+    "9800000002\twithdraw\t500.00\t998400.0\t2025-10-09 09:45:00\n",
+    "9800000001\twithdraw\t200.50\t998199.5\t2025-10-09 17:10:00\n",
+    "9800000002\tdeposit\t300.00\t998499.5\t2025-10-10 08:00:00\n",
+    "9800000002\twithdraw\t100.00\t998399.5\t2025-10-10 08:00:10\n",
+]
+
+
+def write_journal(path, header, rows):
+    with open(path, "w") as journal:
+        journal.write(header)
+        journal.writelines(rows)
+
+
+@pytest.fixture
+def journals(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_journal("client.csv", CLIENT_HEADER, CLIENT_ROWS)
+    write_journal("bank.csv", BANK_HEADER, BANK_ROWS)
+    return tmp_path
+
+
+def test_aggregates_are_kept_per_day(journals):
+    state = update_report("client.csv", "bank.csv", "state.json", chunk_size=64)
+    assert sorted(state["days"]) == ["2025-10-09", "2025-10-10"]
+
+    day = state["days"]["2025-10-09"]
+    assert day["rows"] == 5
+    assert day["withdrawals_per_hour"][9] == 2
+    assert day["withdrawn_per_hour"][9] == 60000
+    assert day["withdrawn_per_hour"][17] == 20050
+    assert day["accounts"] == {"9800000001": (2, 30050), "9800000002": (1, 50000)}
+    assert day["sessions"] == {"count": 1, "total": 45.0, "max": 45.0}
+    assert day["bank"]["withdrawn"] == 80050
+    assert day["bank"]["deposited"] == 0
+    assert (day["bank"]["first_balance"], day["bank"]["last_balance"]) == (99890000, 99819950)
+
+    day = state["days"]["2025-10-10"]
+    assert day["accounts"] == {"9800000002": (1, 10000)}
+    assert (day["bank"]["withdrawn"], day["bank"]["deposited"]) == (10000, 30000)
+    assert day["sessions"]["count"] == 1
+
+
+def test_incremental_run_matches_full_rebuild(journals):
+    write_journal("client.csv", CLIENT_HEADER, CLIENT_ROWS[:3])
+    write_journal("bank.csv", BANK_HEADER, BANK_ROWS[:2])
+    update_report("client.csv", "bank.csv", "state.json")
+
+    with open("client.csv", "a") as journal:
+        journal.writelines(CLIENT_ROWS[3:])
+    with open("bank.csv", "a") as journal:
+        journal.writelines(BANK_ROWS[2:])
+    incremental = update_report("client.csv", "bank.csv", "state.json")
+
+    full = update_report("client.csv", "bank.csv", "full.json", reset=True)
+    assert incremental["days"] == full["days"]
+
+
+def test_plain_loops_match_numpy_path(journals, monkeypatch):
+    pytest.importorskip("numpy")
+    vectorised = empty_state()
+    process_journal(vectorised, "client.csv", aggregate_client_chunk)
+    process_journal(vectorised, "bank.csv", aggregate_bank_chunk)
+
+    monkeypatch.setattr("transaction_report.np", None)
+    looped = empty_state()
+    process_journal(looped, "client.csv", aggregate_client_chunk)
+    process_journal(looped, "bank.csv", aggregate_bank_chunk)
+    assert looped["days"] == vectorised["days"]
+
+
+def test_expire_accounts_keeps_day_totals(journals):
+    state = empty_state()
+    process_journal(state, "client.csv", aggregate_client_chunk)
+    expire_accounts(state, retention_days=1)
+
+    assert state["days"]["2025-10-09"]["accounts"] is None
+    assert state["days"]["2025-10-09"]["withdrawn_per_hour"][9] == 60000
+    assert state["days"]["2025-10-10"]["accounts"] == {"9800000002": (1, 10000)}
@@ -0,0 +1,91 @@
+import json
+import time
+
+from journal_rows import append_rows, journal_row
+from session_timeouts import TimerWheel
+from withdrawal_limits import DailyCounter, SlidingWindowCounter, WithdrawalLimiter
+
+
+def snapshot_accounts(path):
+    with open(path) as state_file:
+        return json.load(state_file)["accounts"]
+
+
+# -----------------------------
+# Withdrawal Limit Counters
+# -----------------------------
+def test_sliding_window_expires_old_buckets():
+    counter = SlidingWindowCounter(window_seconds=60, bucket_seconds=10)
+    counter.add(1000, 500)
+    counter.add(1030, 200)
+
+    assert counter.totals(1059) == (700, 2)
+    assert counter.totals(1060) == (200, 1)  # The first bucket slid out
+    assert counter.totals(1095) == (0, 0)
+    assert counter.totals(5000) == (0, 0)  # Jumps further than the whole window
+
+
+def test_sliding_window_release():
+    counter = SlidingWindowCounter(window_seconds=60, bucket_seconds=10)
+    counter.add(1000, 500)
+    counter.add(1005, 300)
+    counter.add(1005, -300, -1)
+    assert counter.totals(1010) == (500, 1)
+
+    # Releasing a reservation that has already expired changes nothing
+    counter.totals(1100)
+    counter.add(1000, -500, -1)
+    assert counter.totals(1100) == (0, 0)
+
+
+def test_daily_counter_resets_at_midnight_and_releases():
+    today = time.mktime((2025, 10, 9, 12, 0, 0, 0, 0, -1))
+    tomorrow = time.mktime((2025, 10, 10, 0, 0, 1, 0, 0, -1))
+
+    counter = DailyCounter()
+    counter.add(today, 500)
+    counter.add(today + 60, 200)
+    counter.add(today + 60, -200, -1)
+    assert counter.totals(today + 120) == (500, 1)
+    assert counter.totals(tomorrow) == (0, 0)
+
+    counter.add(tomorrow, 100)
+    counter.add(today, 900)  # An earlier day replayed from the journal does not count
+    assert counter.totals(tomorrow) == (100, 1)
+
+
+# -----------------------------
+# Limiter
+# -----------------------------
+def test_limiter_reserves_and_releases():
+    limiter = WithdrawalLimiter(daily_amount=100000, daily_count=3, window_seconds=3600, window_amount=60000)
+    now = time.mktime((2025, 10, 9, 12, 0, 0, 0, 0, -1))
+
+    assert limiter.reserve("9800000001", 50000, now) is None
+    assert limiter.reserve("9800000001", 20000, now).startswith("Withdrawal limit of ₹600.00 per 60 minutes")
+    assert limiter.reserve("9800000002", 50000, now) is None  # Counted per account
+
+    limiter.release("9800000001", 50000, now)
+    assert limiter.reserve("9800000001", 60000, now + 1) is None
+    assert limiter.reserve("9800000001", 10000, now + 3600) is None  # The first one slid out of the window
+    assert limiter.reserve("9800000001", 10000, now + 3601) is None
+    assert limiter.reserve("9800000001", 10000, now + 3602) == "Daily withdrawal count limit of 3 reached."
+
+
+def test_limiter_persists_from_the_timer_wheel(workdir):
+    append_rows("client.csv", [journal_row(0, "login")])
+    limiter = WithdrawalLimiter(daily_amount=100000, state_file="limits.json", persist_interval=0.02)
+    limiter.rebuild("client.csv")
+    limiter.reserve("9800000001", 30000)
+    limiter.start_persisting(TimerWheel(tick=0.01, slots=8))
+    try:
+        # rebuild() wrote a snapshot already; wait for one taken after the reservation
+        deadline = time.monotonic() + 2
+        while "9800000001" not in snapshot_accounts("limits.json") and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        limiter.stop_persisting()
+
+    restored = WithdrawalLimiter(daily_amount=100000, state_file="limits.json")
+    restored.rebuild("client.csv")
+    assert restored.reserve("9800000001", 80000).startswith("Daily withdrawal limit of ₹1000.00 exceeded")
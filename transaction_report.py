@@ -0,0 +1,496 @@
+import argparse
+import array
+import configparser
+import datetime
+import heapq
+import json
+import os
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; plain array loops are used instead
+    np = None
+
+from journal_archive import (CLIENT_TRANSACTION_FILE, BANK_TRANSACTION_FILE, SEGMENT_SUFFIX, Segment,
+                             rotated_segments, stat_journal)
+from logger_utils import get_logger
+from money import parse_journal_paise
+
+# ---------------- CONFIGURATION ----------------
+config = configparser.ConfigParser()
+config.read("config.ini")
+
+REPORT_STATE_FILE = config.get("reporting", "state_file", fallback="report_state.json")
+CHUNK_SIZE = int(config.get("reporting", "chunk_size", fallback=str(4 * 1024 * 1024)))
+TOP_ACCOUNTS = int(config.get("reporting", "top_accounts", fallback="10"))
+# Days for which per-account withdrawal totals are kept; older days keep only their totals
+RETENTION_DAYS = int(config.get("reporting", "retention_days", fallback="31"))
+
+# Value stored in integer columns when the journal cell is empty
+MISSING = -1
+
+# Actions that close a session; their Elapsed_Time is the session duration
+SESSION_END_ACTIONS = ("exit", "logout", "auth_failed", "blacklisted")
+
+logger = get_logger("TransactionReport")
+
+
+# -----------------------------
+# Chunked Journal Reader
+# -----------------------------
+def stream_journal(path, offset=0, chunk_size=CHUNK_SIZE, end_offset=None):
+    """
+    Stream complete lines of a tab-separated journal starting at a byte offset.
+
+    Reads the file in fixed-size buffered chunks so memory stays bounded no
+    matter how large the journal grows. A trailing partial line (a write that
+    is still in progress) is left for the next run.
+
+    Args:
+        path (str): Journal file to read
+        offset (int): Byte offset to resume from (0 reads the whole file)
+        chunk_size (int): Maximum bytes read per chunk
+        end_offset (int): Stop reading at this byte offset instead of the end
+            of the file; a line it cuts through is left unread
+
+    Yields:
+        tuple: (header, lines, end_offset) where header is the list of column
+        names, lines is a list of split rows and end_offset is the byte offset
+        just past the last complete line in this chunk
+    """
+    if not os.path.isfile(path):
+        return
+
+    with open(path, "rb") as journal:
+        header = journal.readline().decode().rstrip("\r\n").split("\t")
+        offset = max(offset, journal.tell())
+        journal.seek(offset)
+
+        position = offset
+        pending = b""
+        while True:
+            size = chunk_size if end_offset is None else min(chunk_size, end_offset - position)
+            chunk = journal.read(size) if size > 0 else b""
+            if not chunk:
+                break
+            position += len(chunk)
+
+            data = pending + chunk
+            cut = data.rfind(b"\n")
+            if cut == -1:
+                pending = data
+                continue
+
+            pending = data[cut + 1:]
+            complete = data[:cut + 1]
+            offset += len(complete)
+            lines = [line.split("\t") for line in complete.decode().splitlines() if line]
+            yield header, lines, offset
+
+
+def stream_new_rows(path, checkpoint=None, chunk_size=CHUNK_SIZE, since=None, end=None):
+    """
+    Stream the journal rows added since a checkpoint, following rotations.
+
+    If the journal was rotated after the checkpoint, the rest of the rotated
+    segment and any later archived segments are read before the live
+    journal, so no rows are lost across a rotation. Without a checkpoint the
+    whole archive is read first.
+
+    Args:
+        path (str): Live journal file
+        checkpoint (dict): {'identity', 'offset'} from a previous run, or None
+        chunk_size (int): Maximum bytes read per chunk of the live journal
+        since (str): Skip archived segments whose rows are all older than
+            this timestamp ('YYYY-MM-DD HH:MM:SS')
+        end (dict): {'identity', 'offset'} of the live journal as taken by
+            stat_journal; rows written after it are left unread, even if the
+            journal has been rotated since
+
+    Yields:
+        tuple: (header, lines, checkpoint) where checkpoint covers every row
+        yielded so far and should be saved once the rows are processed
+    """
+    identity, size = stat_journal(path)
+    offset = 0
+    if checkpoint is None or identity is None or checkpoint.get("identity") != identity:
+        archived = rotated_segments(path, checkpoint and checkpoint.get("identity"),
+                                    checkpoint["offset"] if checkpoint else 0)
+        for segment_path, segment_offset in archived:
+            # Until the live journal is reached, checkpoints point into the segment being read
+            if not segment_path.endswith(SEGMENT_SUFFIX):
+                segment_identity = stat_journal(segment_path)[0]
+                end_offset = end["offset"] if end and end["identity"] == segment_identity else None
+                for header, lines, stop in stream_journal(segment_path, segment_offset, chunk_size, end_offset):
+                    yield header, lines, {"identity": segment_identity, "offset": stop}
+                if end_offset is not None:
+                    return
+                continue
+            with Segment(segment_path) as segment:
+                segment_identity = segment.footer["source_identity"]
+                end_offset = end["offset"] if end and end["identity"] == segment_identity else None
+                if end_offset is None and since is not None and not segment.overlaps(start=since):
+                    continue
+                for lines, stop in segment.text_rows(segment.row_at_offset(segment_offset), end_offset=end_offset):
+                    yield segment.header, lines, {"identity": segment_identity, "offset": stop}
+            if end_offset is not None:
+                return
+    elif size >= checkpoint["offset"]:
+        offset = checkpoint["offset"]
+
+    if end is not None and end["identity"] != identity:
+        return  # The end lies in a journal that is not live, and was not reached
+    for header, lines, offset in stream_journal(path, offset, chunk_size, end and end["offset"]):
+        yield header, lines, {"identity": identity, "offset": offset}
+
+
+def to_paise(text):
+    """
+    Convert a journal amount such as '100.0' or '900.00' to integer paise.
+
+    Legacy amounts with more than two decimals are rounded; a cell that is
+    not a number at all is logged and read as missing, like an empty one.
+    """
+    if not text:
+        return MISSING
+    try:
+        return parse_journal_paise(text)
+    except ValueError:
+        logger.warning(f"Skipping unreadable journal amount {text!r}")
+        return MISSING
+
+
+# -----------------------------
+# Columnar Parsing
+# -----------------------------
+def parse_columns(header, lines):
+    """
+    Parse split journal rows into typed columnar arrays.
+
+    Mobile numbers and actions are dictionary-encoded into small integer
+    codes; amounts and balances are stored as integer paise.
+
+    Returns:
+        dict: Column name to array, plus the 'mobiles' and 'actions' lookup lists
+    """
+    index = {name: position for position, name in enumerate(header)}
+    width = len(header)
+
+    mobiles, mobile_codes = [], {}
+    actions, action_codes = [], {}
+    columns = {
+        "mobile": array.array("q"),
+        "action": array.array("b"),
+        "amount": array.array("q"),
+        "hour": array.array("b"),
+        "timestamp": [],
+    }
+    if "Elapsed_Time" in index:
+        columns["elapsed"] = array.array("d")
+    if "Bank_Balance" in index:
+        columns["bank_balance"] = array.array("q")
+
+    for row in lines:
+        if len(row) < width:
+            row = row + [""] * (width - len(row))
+
+        mobile = row[index["Mobile_Number"]]
+        code = mobile_codes.get(mobile)
+        if code is None:
+            code = mobile_codes[mobile] = len(mobiles)
+            mobiles.append(mobile)
+        columns["mobile"].append(code)
+
+        action = row[index["Action"]]
+        code = action_codes.get(action)
+        if code is None:
+            code = action_codes[action] = len(actions)
+            actions.append(action)
+        columns["action"].append(code)
+
+        columns["amount"].append(to_paise(row[index["Amount"]]))
+
+        timestamp = row[index["Timestamp"]]
+        columns["timestamp"].append(timestamp)
+        columns["hour"].append(int(timestamp[11:13]) if len(timestamp) >= 13 else MISSING)
+
+        if "elapsed" in columns:
+            elapsed = row[index["Elapsed_Time"]]
+            columns["elapsed"].append(float(elapsed) if elapsed else -1.0)
+        if "bank_balance" in columns:
+            columns["bank_balance"].append(to_paise(row[index["Bank_Balance"]]))
+
+    columns["mobiles"] = mobiles
+    columns["actions"] = actions
+    return columns
+
+
+# -----------------------------
+# Aggregations
+# -----------------------------
+def empty_aggregates():
+    """Return the initial (empty) aggregates for one day."""
+    return {
+        "rows": 0,
+        "withdrawals_per_hour": [0] * 24,
+        "withdrawn_per_hour": [0] * 24,
+        "accounts": {},
+        "sessions": {"count": 0, "total": 0.0, "max": 0.0},
+        "bank": {
+            "withdrawn": 0,
+            "deposited": 0,
+            "first_timestamp": None,
+            "last_timestamp": None,
+            "first_balance": None,
+            "last_balance": None,
+        },
+    }
+
+
+def split_days(columns):
+    """
+    Split a parsed chunk into runs of consecutive rows from the same day.
+
+    Yields:
+        tuple: (date, columns) with date as 'YYYY-MM-DD'; the lookup lists
+        are shared, the column arrays are sliced
+    """
+    timestamps = columns["timestamp"]
+    start = 0
+    for position in range(1, len(timestamps) + 1):
+        if position == len(timestamps) or timestamps[position][:10] != timestamps[start][:10]:
+            yield timestamps[start][:10], {
+                name: values if name in ("mobiles", "actions") else values[start:position]
+                for name, values in columns.items()
+            }
+            start = position
+
+
+def _action_mask(columns, names):
+    """Return the action codes in this chunk that match any of the given names."""
+    return [code for code, action in enumerate(columns["actions"]) if action in names]
+
+
+def aggregate_client_chunk(aggregates, columns):
+    """Fold one parsed client.csv chunk into the running aggregates."""
+    aggregates["rows"] += len(columns["action"])
+    withdraw_codes = _action_mask(columns, ("withdraw",))
+    end_codes = _action_mask(columns, SESSION_END_ACTIONS)
+    mobile_count = len(columns["mobiles"])
+
+    if np is not None:
+        action = np.frombuffer(columns["action"], dtype=np.int8)
+        mobile = np.frombuffer(columns["mobile"], dtype=np.int64)
+        amount = np.frombuffer(columns["amount"], dtype=np.int64)
+        hour = np.frombuffer(columns["hour"], dtype=np.int8)
+        elapsed = np.frombuffer(columns["elapsed"], dtype=np.float64)
+
+        is_withdraw = np.isin(action, withdraw_codes) & (amount != MISSING) & (hour >= 0)
+        hourly_count = np.bincount(hour[is_withdraw], minlength=24)
+        hourly_amount = np.bincount(hour[is_withdraw], weights=amount[is_withdraw], minlength=24)
+        account_count = np.bincount(mobile[is_withdraw], minlength=mobile_count)
+        account_amount = np.bincount(mobile[is_withdraw], weights=amount[is_withdraw], minlength=mobile_count)
+
+        durations = elapsed[np.isin(action, end_codes) & (elapsed >= 0)]
+        session_count = int(durations.size)
+        session_total = float(durations.sum()) if session_count else 0.0
+        session_max = float(durations.max()) if session_count else 0.0
+    else:
+        hourly_count = [0] * 24
+        hourly_amount = [0] * 24
+        account_count = [0] * mobile_count
+        account_amount = [0] * mobile_count
+        session_count, session_total, session_max = 0, 0.0, 0.0
+
+        for action, mobile, amount, hour, elapsed in zip(
+            columns["action"], columns["mobile"], columns["amount"],
+            columns["hour"], columns["elapsed"]
+        ):
+            if action in withdraw_codes and amount != MISSING and hour >= 0:
+                hourly_count[hour] += 1
+                hourly_amount[hour] += amount
+                account_count[mobile] += 1
+                account_amount[mobile] += amount
+            elif action in end_codes and elapsed >= 0:
+                session_count += 1
+                session_total += elapsed
+                session_max = max(session_max, elapsed)
+
+    for hour in range(24):
+        aggregates["withdrawals_per_hour"][hour] += int(hourly_count[hour])
+        aggregates["withdrawn_per_hour"][hour] += int(hourly_amount[hour])
+
+    accounts = aggregates["accounts"]
+    for code, mobile in enumerate(columns["mobiles"]):
+        if account_count[code]:
+            count, total = accounts.get(mobile, (0, 0))
+            accounts[mobile] = (count + int(account_count[code]), total + int(account_amount[code]))
+
+    sessions = aggregates["sessions"]
+    sessions["count"] += session_count
+    sessions["total"] += session_total
+    sessions["max"] = max(sessions["max"], session_max)
+
+
+def aggregate_bank_chunk(aggregates, columns):
+    """Fold one parsed bank.csv chunk into the running aggregates."""
+    if not columns["action"]:
+        return
+
+    bank = aggregates["bank"]
+    withdraw_codes = _action_mask(columns, ("withdraw",))
+    deposit_codes = _action_mask(columns, ("deposit",))
+
+    if np is not None:
+        action = np.frombuffer(columns["action"], dtype=np.int8)
+        amount = np.frombuffer(columns["amount"], dtype=np.int64)
+        valid = amount != MISSING
+        bank["withdrawn"] += int(amount[np.isin(action, withdraw_codes) & valid].sum())
+        bank["deposited"] += int(amount[np.isin(action, deposit_codes) & valid].sum())
+    else:
+        for action, amount in zip(columns["action"], columns["amount"]):
+            if amount == MISSING:
+                continue
+            if action in withdraw_codes:
+                bank["withdrawn"] += amount
+            elif action in deposit_codes:
+                bank["deposited"] += amount
+
+    if bank["first_timestamp"] is None:
+        bank["first_timestamp"] = columns["timestamp"][0]
+        bank["first_balance"] = columns["bank_balance"][0]
+    bank["last_timestamp"] = columns["timestamp"][-1]
+    bank["last_balance"] = columns["bank_balance"][-1]
+
+
+# -----------------------------
+# Incremental State
+# -----------------------------
+def empty_state():
+    """Return a state with no journals processed."""
+    return {"journals": {}, "days": {}}
+
+
+def load_state(path=REPORT_STATE_FILE):
+    """Load the last processed offsets and the per-day aggregates."""
+    if os.path.isfile(path):
+        with open(path) as state_file:
+            state = json.load(state_file)
+        for aggregates in state["days"].values():
+            if aggregates["accounts"] is not None:
+                aggregates["accounts"] = {
+                    mobile: tuple(values) for mobile, values in aggregates["accounts"].items()
+                }
+        return state
+    return empty_state()
+
+
+def save_state(state, path=REPORT_STATE_FILE):
+    """Atomically persist offsets and aggregates for the next incremental run."""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as state_file:
+        json.dump(state, state_file)
+    os.replace(temp_path, path)
+
+
+def process_journal(state, path, aggregate, chunk_size=CHUNK_SIZE):
+    """Stream new rows of one journal into the per-day aggregates and advance its checkpoint."""
+    days = state["days"]
+    checkpoint = state["journals"].get(path)
+    for header, lines, checkpoint in stream_new_rows(path, checkpoint, chunk_size):
+        for date, columns in split_days(parse_columns(header, lines)):
+            if date not in days:
+                days[date] = empty_aggregates()
+            aggregate(days[date], columns)
+    if checkpoint is not None:
+        state["journals"][path] = checkpoint
+
+
+def expire_accounts(state, retention_days=RETENTION_DAYS):
+    """Drop per-account maps of days older than the retention window, keeping memory bounded."""
+    if not state["days"]:
+        return
+    latest = datetime.date.fromisoformat(max(state["days"]))
+    cutoff = (latest - datetime.timedelta(days=retention_days - 1)).isoformat()
+    for date, aggregates in state["days"].items():
+        if date < cutoff:
+            aggregates["accounts"] = None
+
+
+def update_report(client_file=CLIENT_TRANSACTION_FILE, bank_file=BANK_TRANSACTION_FILE,
+                  state_file=REPORT_STATE_FILE, reset=False, chunk_size=CHUNK_SIZE):
+    """Process any journal data added since the last run and return the updated state."""
+    state = empty_state() if reset else load_state(state_file)
+    process_journal(state, client_file, aggregate_client_chunk, chunk_size)
+    process_journal(state, bank_file, aggregate_bank_chunk, chunk_size)
+    expire_accounts(state)
+    save_state(state, state_file)
+    return state
+
+
+# -----------------------------
+# Report Formatting
+# -----------------------------
+def _rupees(paise):
+    return f"₹{paise / 100:,.2f}"
+
+
+def format_report(date, aggregates, top=TOP_ACCOUNTS):
+    """Render one day's aggregates as a plain-text daily report."""
+    lines = [f"Daily report for {date}", f"Journal rows processed: {aggregates['rows']}", "", "Withdrawals per hour:"]
+    for hour in range(24):
+        count = aggregates["withdrawals_per_hour"][hour]
+        if count:
+            lines.append(f"  {hour:02d}:00  {count:6d}  {_rupees(aggregates['withdrawn_per_hour'][hour])}")
+
+    lines.extend(["", f"Top {top} accounts by amount withdrawn:"])
+    if aggregates["accounts"] is None:
+        lines.append(f"  (per-account detail is kept for {RETENTION_DAYS} days)")
+    else:
+        ranked = heapq.nlargest(top, aggregates["accounts"].items(), key=lambda item: item[1][1])
+        for mobile, (count, total) in ranked:
+            lines.append(f"  {mobile:<15} {count:6d}  {_rupees(total)}")
+
+    sessions = aggregates["sessions"]
+    average = sessions["total"] / sessions["count"] if sessions["count"] else 0.0
+    lines.extend([
+        "",
+        f"Sessions: {sessions['count']} | Average duration: {average:.2f}s | Longest: {sessions['max']:.2f}s",
+    ])
+
+    bank = aggregates["bank"]
+    lines.extend(["", f"Bank withdrawn: {_rupees(bank['withdrawn'])} | Deposited: {_rupees(bank['deposited'])}"])
+    if bank["first_timestamp"]:
+        hours = _hours_between(bank["first_timestamp"], bank["last_timestamp"])
+        net_outflow = bank["withdrawn"] - bank["deposited"]
+        rate = net_outflow / hours if hours else 0
+        lines.append(
+            f"Bank balance: {_rupees(bank['first_balance'])} ({bank['first_timestamp']}) -> "
+            f"{_rupees(bank['last_balance'])} ({bank['last_timestamp']})"
+        )
+        lines.append(f"Net cash-out rate: {_rupees(rate)} per hour over {hours:.1f}h")
+
+    return "\n".join(lines)
+
+
+def _hours_between(first, last):
+    fmt = "%Y-%m-%d %H:%M:%S"
+    delta = datetime.datetime.strptime(last, fmt) - datetime.datetime.strptime(first, fmt)
+    return delta.total_seconds() / 3600
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incremental report over the ATM transaction journals.")
+    parser.add_argument("--client-file", default=CLIENT_TRANSACTION_FILE)
+    parser.add_argument("--bank-file", default=BANK_TRANSACTION_FILE)
+    parser.add_argument("--state-file", default=REPORT_STATE_FILE)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--reset", action="store_true", help="Ignore saved offsets and rebuild from scratch")
+    parser.add_argument("--date", help="Day to report, YYYY-MM-DD (default: the latest day in the journals)")
+    args = parser.parse_args()
+
+    state = update_report(args.client_file, args.bank_file, args.state_file, args.reset, args.chunk_size)
+    date = args.date or max(state["days"], default=None)
+    if date not in state["days"]:
+        parser.exit(1, f"No journal rows for {date}\n" if date else "No journal rows yet\n")
+    print(format_report(date, state["days"][date]))
@@ -0,0 +1,348 @@
+import array
+import configparser
+import json
+import os
+import threading
+import time
+
+from logger_utils import get_logger
+from journal_archive import checkpoint_resolves, stat_journal
+from money import format_paise, parse_amount
+from session_timeouts import get_timer_wheel
+
+
+class SlidingWindowCounter:
+    """
+    Rolling-window amount and count, kept in a ring of fixed-size time buckets.
+
+    Reading or updating the totals is O(1): expired buckets are subtracted
+    from running totals as the window slides, so no history is scanned.
+    """
+
+    __slots__ = ("bucket_seconds", "amounts", "counts", "head", "total_amount", "total_count")
+
+    def __init__(self, window_seconds, bucket_seconds):
+        """
+        Initialize an empty window
+
+        Args:
+            window_seconds (int): Length of the rolling window
+            bucket_seconds (int): Resolution of the window; events in the
+                oldest bucket expire together
+        """
+        slots = max(1, -(-window_seconds // bucket_seconds))
+        self.bucket_seconds = bucket_seconds
+        self.amounts = array.array("q", [0]) * slots
+        self.counts = array.array("l", [0]) * slots
+        self.head = None
+        self.total_amount = 0
+        self.total_count = 0
+
+    def _advance(self, now):
+        """Expire buckets that have slid out of the window; return the current bucket."""
+        current = int(now // self.bucket_seconds)
+        if self.head is None:
+            self.head = current
+            return current
+
+        gap = current - self.head
+        if gap <= 0:
+            return current
+
+        slots = len(self.amounts)
+        if gap >= slots:
+            for slot in range(slots):
+                self.amounts[slot] = 0
+                self.counts[slot] = 0
+            self.total_amount = 0
+            self.total_count = 0
+        else:
+            for step in range(1, gap + 1):
+                slot = (self.head + step) % slots
+                self.total_amount -= self.amounts[slot]
+                self.total_count -= self.counts[slot]
+                self.amounts[slot] = 0
+                self.counts[slot] = 0
+        self.head = current
+        return current
+
+    def totals(self, now):
+        """Return (amount, count) within the window ending at now."""
+        self._advance(now)
+        return self.total_amount, self.total_count
+
+    def add(self, now, amount, count=1):
+        """Add an event at time now (negative values undo an earlier add)."""
+        bucket = self._advance(now)
+        if bucket <= self.head - len(self.amounts):
+            return  # Older than the window (journal replay); already expired
+        slot = bucket % len(self.amounts)
+        self.amounts[slot] += amount
+        self.counts[slot] += count
+        self.total_amount += amount
+        self.total_count += count
+
+    def to_dict(self):
+        return {
+            "head": self.head,
+            "amounts": self.amounts.tolist(),
+            "counts": self.counts.tolist(),
+        }
+
+    def load_dict(self, data):
+        if len(data["amounts"]) != len(self.amounts):
+            return  # Window configuration changed; the journal replay rebuilds it
+        self.head = data["head"]
+        self.amounts = array.array("q", data["amounts"])
+        self.counts = array.array("l", data["counts"])
+        self.total_amount = sum(self.amounts)
+        self.total_count = sum(self.counts)
+
+
+class DailyCounter:
+    """Amount and count for the current local calendar day."""
+
+    __slots__ = ("day", "amount", "count")
+
+    def __init__(self):
+        self.day = None
+        self.amount = 0
+        self.count = 0
+
+    def totals(self, now):
+        """Return (amount, count) for the calendar day containing now."""
+        if self.day != time.localtime(now)[:3]:
+            return 0, 0
+        return self.amount, self.count
+
+    def add(self, now, amount, count=1):
+        day = time.localtime(now)[:3]
+        if day != self.day:
+            if self.day is not None and day < self.day:
+                return  # An earlier day (journal replay) does not count towards today
+            self.day, self.amount, self.count = day, 0, 0
+        self.amount += amount
+        self.count += count
+
+
+class WithdrawalLimiter:
+    """
+    Enforces per-account daily and rolling-window withdrawal limits in memory.
+
+    Counters are keyed by mobile number rather than by session, so they
+    hold across reconnects. They are rebuilt at startup from a snapshot plus
+    the withdrawals journaled after it, and the snapshot is rewritten
+    periodically from the timer wheel thread, outside any customer request.
+    A limit of 0 disables that limit.
+    """
+
+    def __init__(self, daily_amount=0, daily_count=0, window_seconds=3600, window_amount=0,
+                 window_count=0, bucket_seconds=60, state_file="limits_state.json", persist_interval=300):
+        self.daily_amount = daily_amount
+        self.daily_count = daily_count
+        self.window_seconds = window_seconds
+        self.window_amount = window_amount
+        self.window_count = window_count
+        self.bucket_seconds = bucket_seconds
+        self.state_file = state_file
+        self.persist_interval = persist_interval
+        self.accounts = {}
+        self.journal = None
+        self.lock = threading.Lock()
+        self.persist_lock = threading.Lock()
+        self.wheel = None
+        self.persist_timer = None
+        self.logger = get_logger("WithdrawalLimiter")
+
+    def _counters(self, mobile):
+        counters = self.accounts.get(mobile)
+        if counters is None:
+            counters = self.accounts[mobile] = (
+                DailyCounter(),
+                SlidingWindowCounter(self.window_seconds, self.bucket_seconds),
+            )
+        return counters
+
+    def _limit_error(self, counters, amount, now):
+        daily, window = counters
+        daily_amount, daily_count = daily.totals(now)
+        if self.daily_count and daily_count + 1 > self.daily_count:
+            return f"Daily withdrawal count limit of {self.daily_count} reached."
+        if self.daily_amount and daily_amount + amount > self.daily_amount:
+            remaining = format_paise(max(0, self.daily_amount - daily_amount))
+            return f"Daily withdrawal limit of ₹{format_paise(self.daily_amount)} exceeded. Remaining today: ₹{remaining}."
+
+        window_amount, window_count = window.totals(now)
+        minutes = self.window_seconds // 60
+        if self.window_count and window_count + 1 > self.window_count:
+            return f"Too many withdrawals. At most {self.window_count} allowed per {minutes} minutes."
+        if self.window_amount and window_amount + amount > self.window_amount:
+            remaining = format_paise(max(0, self.window_amount - window_amount))
+            return (f"Withdrawal limit of ₹{format_paise(self.window_amount)} per {minutes} minutes exceeded. "
+                    f"Remaining: ₹{remaining}.")
+        return None
+
+    def reserve(self, mobile, amount, now=None):
+        """
+        Check a withdrawal against the limits and count it if allowed.
+
+        Returns:
+            str: Error message if a limit would be exceeded, otherwise None.
+            Callers must release() the reservation if the withdrawal fails.
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            counters = self._counters(mobile)
+            error = self._limit_error(counters, amount, now)
+            if error is None:
+                for counter in counters:
+                    counter.add(now, amount)
+        return error
+
+    def release(self, mobile, amount, now):
+        """Undo a reservation made at time now by reserve()."""
+        with self.lock:
+            for counter in self._counters(mobile):
+                counter.add(now, -amount, -1)
+
+    # -----------------------------
+    # Rebuild and Persistence
+    # -----------------------------
+    def rebuild(self, journal_path):
+        """
+        Restore counters from the snapshot and replay withdrawals journaled after it.
+
+        Rows rotated into the journal archive since the snapshot are replayed
+        too; archived segments older than the longest window are skipped.
+        """
+        from transaction_report import stream_new_rows, to_paise
+
+        self.journal = journal_path
+        checkpoint = self._load_snapshot()
+        horizon = time.time() - max(self.window_seconds, 86400)
+        since = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(horizon))
+        replayed = 0
+
+        for header, lines, _ in stream_new_rows(journal_path, checkpoint, since=since):
+            index = {name: position for position, name in enumerate(header)}
+            for line in lines:
+                if len(line) < len(header) or line[index["Action"]] != "withdraw":
+                    continue
+                try:
+                    timestamp = time.mktime(time.strptime(line[index["Timestamp"]], "%Y-%m-%d %H:%M:%S"))
+                    amount = to_paise(line[index["Amount"]])
+                except ValueError:
+                    continue
+                if timestamp < horizon:
+                    continue
+                for counter in self._counters(line[index["Mobile_Number"]]):
+                    counter.add(timestamp, amount)
+                replayed += 1
+
+        self.logger.info(f"Withdrawal limits rebuilt: {len(self.accounts)} accounts, {replayed} journal rows replayed")
+        self.persist()
+
+    def _load_snapshot(self):
+        """
+        Load counters from the snapshot; return the journal checkpoint it covers (or None).
+
+        Counters are only loaded if the checkpoint can still be found in the
+        journal or its archive. Otherwise the rows after it cannot be told
+        apart from those before it, and the rebuild starts from the journal
+        alone rather than counting withdrawals twice.
+        """
+        if not os.path.isfile(self.state_file):
+            return None
+        try:
+            with open(self.state_file) as state_file:
+                snapshot = json.load(state_file)
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Ignoring unreadable limits snapshot: {e}")
+            return None
+
+        checkpoint = {"identity": snapshot["identity"], "offset": snapshot["offset"]}
+        if not checkpoint_resolves(self.journal, checkpoint):
+            self.logger.info("Limits snapshot does not match the journal or its archive; rebuilding from the journal")
+            return None
+
+        for mobile, (day, daily_amount, daily_count, window) in snapshot["accounts"].items():
+            daily, sliding = self._counters(mobile)
+            daily.day = tuple(day) if day else None
+            daily.amount, daily.count = daily_amount, daily_count
+            sliding.load_dict(window)
+        return checkpoint
+
+    def start_persisting(self, wheel=None):
+        """Rewrite the snapshot every persist_interval seconds on the timer wheel thread."""
+        self.wheel = wheel or get_timer_wheel()
+        self.persist_timer = self.wheel.schedule(self.persist_interval, self._persist_tick)
+
+    def stop_persisting(self):
+        """Stop the periodic snapshot (the caller writes the final one)."""
+        if self.wheel is not None:
+            self.wheel.cancel(self.persist_timer)
+            self.wheel = None
+
+    def _persist_tick(self):
+        try:
+            self.persist()
+        finally:
+            if self.wheel is not None:
+                self.persist_timer = self.wheel.schedule(self.persist_interval, self._persist_tick)
+
+    def persist(self):
+        """
+        Write the counters and the journal offset they cover to the snapshot.
+
+        Withdrawals still in flight are counted in the snapshot and may be
+        replayed again if journaled after it, which can only over-count
+        (never under-count) until they slide out of the window.
+        """
+        if self.journal is None:
+            return
+
+        with self.persist_lock:
+            self._write_snapshot()
+
+    def _write_snapshot(self):
+        with self.lock:
+            # Identity and offset of the same file, so a rotation cannot pair them up wrongly
+            identity, offset = stat_journal(self.journal)
+            now = time.time()
+            accounts = {}
+            for mobile, (daily, window) in list(self.accounts.items()):
+                if daily.totals(now) == (0, 0) and window.totals(now) == (0, 0):
+                    del self.accounts[mobile]  # Idle accounts are dropped to keep memory compact
+                    continue
+                accounts[mobile] = (daily.day, daily.amount, daily.count, window.to_dict())
+
+        snapshot = {"identity": identity, "offset": offset, "accounts": accounts}
+        temp_path = f"{self.state_file}.tmp"
+        try:
+            with open(temp_path, "w") as state_file:
+                json.dump(snapshot, state_file)
+            os.replace(temp_path, self.state_file)
+        except OSError as e:
+            self.logger.error(f"Failed to persist withdrawal limits: {e}")
+
+
+# Singleton instance
+_limiter = None
+
+def get_limiter():
+    """Get the singleton limiter configured from config.ini"""
+    global _limiter
+    if _limiter is None:
+        config = configparser.ConfigParser()
+        config.read("config.ini")
+        _limiter = WithdrawalLimiter(
+            daily_amount=parse_amount(config.get("limits", "daily_amount", fallback="20000")),
+            daily_count=int(config.get("limits", "daily_count", fallback="10")),
+            window_seconds=int(config.get("limits", "window_seconds", fallback="3600")),
+            window_amount=parse_amount(config.get("limits", "window_amount", fallback="10000")),
+            window_count=int(config.get("limits", "window_count", fallback="5")),
+            bucket_seconds=int(config.get("limits", "bucket_seconds", fallback="60")),
+            state_file=config.get("limits", "state_file", fallback="limits_state.json"),
+            persist_interval=int(config.get("limits", "persist_interval", fallback="300")),
+        )
+    return _limiter